@@ -0,0 +1,182 @@
+import argparse
+import json
+import os
+import time
+import pandas as pd
+from concurrency import limited_caller
+from extraction_manifest import LEGACY_HASH, ExtractionManifest, content_hashes, manifest_path, pipeline_fingerprint
+from trial_data import DATA_FILE, load_trials, with_concatenated_text
+from module1 import iter_extract_lab_values
+from module2 import prepare_database_ready_answers
+from fused_extraction import iter_extract_and_normalize
+
+# Headless batch run over the whole dataset:
+#   python batch_cli.py --output results.jsonl
+# Each completed trial is appended to <output>.manifest.tsv with a hash of its text, so re-running the
+# same command resumes where it stopped, and a run against a refreshed data file only re-extracts the
+# trials that are new or whose text changed.
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract and normalize lab values for every trial in the data file.")
+    parser.add_argument("--data", default=DATA_FILE, help="Trial data pickle or trial store directory to process")
+    parser.add_argument("--output", default="lab_values.jsonl", help="Output .jsonl file, or a directory of parquet parts with --format parquet")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], default="jsonl")
+    parser.add_argument("--chunk-size", type=int, default=100, help="Trials per chunk (one parquet part per chunk)")
+    parser.add_argument("--max-workers", type=int, default=8)
+    parser.add_argument("--requests-per-minute", type=float, default=None)
+    parser.add_argument("--limit", type=int, default=None, help="Only process the first N trials")
+    parser.add_argument("--fused", action="store_true", help="Extract and normalize in one model call per trial")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk response cache")
+    return parser.parse_args(argv)
+
+# Function to read the NCTIds finished by runs that predate the manifest
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path) as f:
+        return {line.strip() for line in f if line.strip()}
+
+# Parquet part file name; the millisecond timestamp comes first so names sort in write order across runs
+def part_name(part_number):
+    return f"part-{int(time.time() * 1000):013d}-{part_number:05d}.parquet"
+
+# Function to sort part files in write order; parts named part-<part>-<ms> by older runs are read as (ms, part)
+def part_order(name):
+    numbers = name[len("part-"):-len(".parquet")].split("-")
+    return tuple(int(number) for number in sorted(numbers, key=len, reverse=True))
+
+# Function to list the parquet parts of the output, oldest first
+def output_parts(args):
+    if not os.path.isdir(args.output):
+        return []
+    return sorted((name for name in os.listdir(args.output) if name.endswith(".parquet")), key=part_order)
+
+# Function to read the NCTIds present in the output (a trial may appear more than once)
+def output_nct_ids(args):
+    if args.format == "jsonl":
+        if not os.path.exists(args.output):
+            return set()
+        with open(args.output, encoding="utf-8") as f:
+            return {json.loads(line)["NCTId"] for line in f if line.strip()}
+    return {nct_id for name in output_parts(args)
+            for nct_id in pd.read_parquet(os.path.join(args.output, name), columns=["NCTId"])["NCTId"]}
+
+# Function to persist a chunk of output records, then record their content hashes in the manifest.
+# A crash between the two leaves records without a manifest line; main drops them on resume.
+def write_chunk(records, args, manifest, hashes, part_number):
+    if args.format == "jsonl":
+        with open(args.output, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    else:
+        os.makedirs(args.output, exist_ok=True)
+        pd.DataFrame(records).to_parquet(os.path.join(args.output, part_name(part_number)), index=False)
+    manifest.record([record["NCTId"] for record in records], [hashes[record["NCTId"]] for record in records])
+
+# Function to rewrite the output with the latest record per NCTId, dropping trials not in keep (None keeps all)
+def compact_output(args, keep=None):
+    if args.format == "jsonl":
+        if not os.path.exists(args.output):
+            return
+        latest = {}
+        with open(args.output, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    latest[record["NCTId"]] = line
+        temporary = args.output + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.writelines(line for nct_id, line in latest.items() if keep is None or nct_id in keep)
+        os.replace(temporary, args.output)
+    else:
+        parts = output_parts(args)
+        if not parts:
+            return
+        frame = pd.concat([pd.read_parquet(os.path.join(args.output, name)) for name in parts], ignore_index=True)
+        frame = frame.drop_duplicates("NCTId", keep="last")
+        if keep is not None:
+            frame = frame[frame["NCTId"].isin(keep)]
+        compacted = part_name(0)
+        frame.to_parquet(os.path.join(args.output, compacted), index=False)
+        for name in parts:
+            if name != compacted:
+                os.remove(os.path.join(args.output, name))
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.perf_counter()
+    # Only the requested slice gets a concatenated_text column
+    trials = load_trials(args.data, concatenate=False)
+    if args.limit:
+        trials = trials.head(args.limit)
+    trials = with_concatenated_text(trials)
+
+    hashes = content_hashes(trials, pipeline_fingerprint(args.fused))
+    hashes.index = trials['NCTId']
+    manifest = ExtractionManifest(manifest_path(args.output))
+    # Trials finished under the old .done checkpoint were extracted with an unknown prompt and text:
+    # they are taken over with a sentinel hash, so they are extracted again and their old records replaced
+    legacy = [nct_id for nct_id in load_checkpoint(args.output.rstrip("/\\") + ".done") if nct_id in hashes.index and nct_id not in manifest]
+    if legacy:
+        manifest.record(legacy, [LEGACY_HASH] * len(legacy))
+    # Records written after the last manifest line (a crash mid-chunk) are dropped and extracted again
+    if output_nct_ids(args) - set(manifest.hashes):
+        compact_output(args, set(manifest.hashes))
+    pending, counts = manifest.diff(trials, hashes.to_numpy())
+    # With --limit the manifest trials outside the slice are not removed, so they are not reported as such
+    removed = "" if args.limit else f", {counts['removed']} no longer in the data"
+    print(f"{len(trials)} trials: {counts['reused']} reused, {counts['new']} new, {counts['modified']} modified"
+          f"{removed}; {len(pending)} to process")
+    # Normalization fallback calls share one rate limit and retry on transient errors, like extraction
+    normalize_call = limited_caller(args.requests_per_minute, stage="normalize")
+
+    processed, calls_avoided = 0, 0
+    for part_number, start in enumerate(range(0, len(pending), args.chunk_size)):
+        chunk = pending.iloc[start:start + args.chunk_size]
+        stats = {}
+        if args.fused:
+            records = list(iter_extract_and_normalize(
+                chunk,
+                max_workers=args.max_workers,
+                requests_per_minute=args.requests_per_minute,
+                use_cache=not args.no_cache,
+                stats=stats,
+            ))
+        else:
+            extracted = list(iter_extract_lab_values(
+                chunk,
+                max_workers=args.max_workers,
+                requests_per_minute=args.requests_per_minute,
+                use_cache=not args.no_cache,
+                stats=stats,
+            ))
+            normalized = prepare_database_ready_answers(extracted, use_cache=not args.no_cache, call=normalize_call)
+            records = [
+                {"NCTId": record["NCTId"], "LAB_VALUES": record["LAB_VALUES"], "DatabaseReadyLabValues": ready["DatabaseReadyLabValues"]}
+                for record, ready in zip(extracted, normalized)
+            ]
+        write_chunk(records, args, manifest, hashes, part_number)
+        processed += len(records)
+        calls_avoided += stats.get("calls_avoided", 0)
+        elapsed = time.perf_counter() - started
+        print(f"  {processed}/{len(pending)} trials ({processed / elapsed:.2f} trials/s)")
+
+    # Drop superseded records of modified trials, and trials removed from a full (unlimited) data file
+    if counts['modified'] or (counts['removed'] and not args.limit):
+        keep = None if args.limit else set(trials['NCTId'])
+        compact_output(args, keep)
+        manifest.compact(keep if keep is not None else list(manifest.hashes))
+
+    elapsed = time.perf_counter() - started
+    print("Summary:")
+    print(f"  processed:      {processed} trials in {elapsed:.1f} s")
+    print(f"  throughput:     {processed / elapsed if elapsed else 0:.2f} trials/s")
+    print(f"  reused:         {counts['reused']}")
+    print(f"  recomputed:     {processed} ({counts['new']} new, {counts['modified']} modified)")
+    print(f"  calls avoided:  {calls_avoided}")
+    print(f"  output:         {args.output}")
+
+if __name__ == "__main__":
+    main()
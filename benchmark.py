@@ -0,0 +1,218 @@
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from criteria_slicer import estimate_tokens
+from fused_extraction import FUSED_PROMPT
+from lab_normalizer import LAB_STANDARDS, UnparseableLabValue, normalize_entry
+from lab_store import LabRequirementStore
+from model_client import StubBackend, set_client
+from trial_data import build_concatenated_text
+
+# Benchmark of the extraction pipeline on synthetic trials against a simulated-latency backend:
+#   python benchmark.py --sizes 10,1000,100000 --latency 0.05 --output results/benchmarks/run.json
+
+# Lab sentence templates used to build synthetic criteria; the stub responder reads them back
+SYNTHETIC_LABS = {
+    "Hemoglobin required": ("Hemoglobin", "g/L", (80, 120)),
+    "Hematocrit required": ("Hematocrit", "%", (25, 40)),
+    "Platelet count required": ("Platelet count", "x10^9/L", (50, 150)),
+    "White blood cell required": ("White blood cell count", "x10^9/L", (2, 4)),
+    "Absolute neutrophil count (ANC) or absolute granulocyte count required": ("Absolute neutrophil count", "x10^9/L", (1, 2)),
+    "Creatinine required": ("Creatinine", "mg/dL", (1, 2)),
+    "Creatinine clearance or GFR required": ("Creatinine clearance", "ml/min", (30, 60)),
+    "AST required": ("AST", "x ULN", (2, 5)),
+    "ALT required": ("ALT", "x ULN", (2, 5)),
+    "Albumin required": ("Albumin", "g/dL", (2, 4)),
+    "Alkaline phosphatase required": ("Alkaline phosphatase", "x ULN", (2, 5)),
+    "Bilirubin required": ("Bilirubin", "x ULN", (1, 3)),
+}
+FILLER_SENTENCES = [
+    "Age 18 years or older at the time of consent.",
+    "Able to understand and willing to sign a written informed consent document.",
+    "ECOG performance status of 0 to 2.",
+    "Histologically confirmed diagnosis of the disease under study.",
+    "Women of childbearing potential must agree to use adequate contraception.",
+    "Prior treatment with an investigational agent within 4 weeks.",
+    "Known hypersensitivity to any component of the study drug.",
+    "Uncontrolled intercurrent illness including active infection.",
+]
+SENTENCE_PATTERN = re.compile(r"\* (.+?) (greater than or equal to|less than or equal to|greater than|less than) ([0-9.]+) (\S+(?: ULN)?)")
+RELATION_REVERSAL = {"greater than": "less than or equal to", "greater than or equal to": "less than",
+                     "less than": "greater than or equal to", "less than or equal to": "greater than"}
+PACKED_TRIAL_PATTERN = re.compile(r"^### NCTId: (\S+)\n", re.MULTILINE)
+
+# Function to build n synthetic trials; criteria_sentences sets length, lab_density the chance each lab appears
+def synthetic_trials(n, criteria_sentences=20, lab_density=0.3, seed=0):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        inclusion, exclusion = [], []
+        for lab, (name, unit, (low, high)) in SYNTHETIC_LABS.items():
+            if rng.random() < lab_density:
+                relation = rng.choice(list(RELATION_REVERSAL))
+                value = round(rng.uniform(low, high), 1)
+                (inclusion if rng.random() < 0.7 else exclusion).append(f"* {name} {relation} {value} {unit}")
+        length = max(1, int(rng.gauss(criteria_sentences, criteria_sentences / 3)))
+        for _ in range(length):
+            (inclusion if rng.random() < 0.5 else exclusion).append("* " + rng.choice(FILLER_SENTENCES))
+        criteria = "Inclusion Criteria:\n\n" + "\n".join(inclusion) + "\n\nExclusion Criteria:\n\n" + "\n".join(exclusion)
+        rows.append({"NCTId": f"NCT9{i:07d}", "Conditions": "Synthetic condition", "Keywords": "synthetic",
+                     "BriefTitle": f"Synthetic trial {i}", "EligibilityCriteria": criteria})
+    df = pd.DataFrame(rows)
+    df["concatenated_text"] = build_concatenated_text(df)
+    return df
+
+# Function to read the synthetic lab sentences of one trial back as {lab: [relationship, value]}
+def synthetic_lab_values(text):
+    result = {lab: ["", ""] for lab in LAB_STANDARDS}
+    names = {name.lower(): lab for lab, (name, _, _) in SYNTHETIC_LABS.items()}
+    section = "inclusion"
+    for line in text.splitlines():
+        if line.lower().startswith("exclusion"):
+            section = "exclusion"
+        match = SENTENCE_PATTERN.match(line.strip())
+        if match and match.group(1).lower() in names:
+            relation = match.group(2) if section == "inclusion" else RELATION_REVERSAL[match.group(2)]
+            result[names[match.group(1).lower()]] = [relation, f"{match.group(3)} {match.group(4)}"]
+    return result
+
+# Function to answer in the fused schema, with the range the local rules give for each pair
+def synthetic_fused_values(lab_values):
+    result = {}
+    for lab, (relation, value) in lab_values.items():
+        try:
+            lab_range = normalize_entry(lab, [relation, value])
+        except UnparseableLabValue:
+            lab_range = None
+        result[lab] = {"relation": relation, "value": value, "range": lab_range}
+    return result
+
+# Stub responder that answers extraction prompts from the synthetic lab sentences they contain:
+# one object per NCTId for packed batch prompts, and the fused schema for fused prompts
+def synthetic_response(prompt):
+    text = prompt.split("\nText: ", 1)[-1]
+    answer = synthetic_fused_values if FUSED_PROMPT in prompt else (lambda lab_values: lab_values)
+    sections = PACKED_TRIAL_PATTERN.split(text)
+    if len(sections) > 1:
+        return json.dumps({nct_id: answer(synthetic_lab_values(trial_text))
+                           for nct_id, trial_text in zip(sections[1::2], sections[2::2])})
+    return json.dumps(answer(synthetic_lab_values(text)))
+
+# Stub backend wrapper that records latency and prompt size of every call
+class RecordingBackend(StubBackend):
+    def __init__(self, latency, jitter):
+        super().__init__(latency=latency, jitter=jitter, responder=synthetic_response, model_name="benchmark-stub")
+        self.latencies = []
+        self.prompt_tokens = 0
+        self.system_instruction_tokens = 0
+        self.record_lock = threading.Lock()
+
+    def generate(self, prompt, timeout=None, system_instruction=None):
+        started = time.perf_counter()
+        response = super().generate(prompt, timeout, system_instruction)
+        with self.record_lock:
+            self.latencies.append(time.perf_counter() - started)
+            self.prompt_tokens += estimate_tokens(prompt)
+            if system_instruction:
+                self.system_instruction_tokens += estimate_tokens(system_instruction)
+        return response
+
+def percentiles(values):
+    if not values:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"p50": float(p50), "p95": float(p95), "p99": float(p99)}
+
+# Function to run extraction, normalization and parsing for one synthetic dataset size
+def run_size(n, args):
+    from module1 import extract_lab_values
+    from module2 import prepare_database_ready_answers
+    from fused_extraction import extract_and_normalize
+
+    trials = synthetic_trials(n, args.criteria_sentences, args.lab_density, args.seed)
+    backend = set_client(RecordingBackend(args.latency, args.jitter))
+    if args.tracemalloc:
+        tracemalloc.start()
+    stages = {}
+
+    started = time.perf_counter()
+    if args.fused:
+        extracted, normalized = extract_and_normalize(trials, max_workers=args.max_workers, use_cache=False)
+        stages["extract_seconds"] = time.perf_counter() - started
+        extract_calls = len(backend.latencies)
+    else:
+        extracted = extract_lab_values(trials, max_workers=args.max_workers, use_cache=False,
+                                       batch_token_budget=args.batch_token_budget)
+        stages["extract_seconds"] = time.perf_counter() - started
+        extract_calls = len(backend.latencies)
+
+        stage_started = time.perf_counter()
+        normalized = prepare_database_ready_answers(extracted, use_cache=False)
+        stages["normalize_seconds"] = time.perf_counter() - stage_started
+
+    stage_started = time.perf_counter()
+    store = LabRequirementStore().add_records(extracted)
+    store.add_records(normalized, column_name="DatabaseReadyLabValues", kind="database_ready")
+    rows = len(store.frame)
+    stages["parse_seconds"] = time.perf_counter() - stage_started
+    total = time.perf_counter() - started
+
+    peak_bytes = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    if args.tracemalloc:
+        tracemalloc.stop()
+    return {
+        "trials": n,
+        "total_seconds": total,
+        "throughput_trials_per_second": n / total if total else 0.0,
+        **stages,
+        "model_calls": len(backend.latencies),
+        "extract_calls": extract_calls,
+        "normalize_calls": len(backend.latencies) - extract_calls,
+        "call_latency_seconds": percentiles(backend.latencies),
+        "prompt_tokens_per_trial": backend.prompt_tokens / n if n else 0.0,
+        "system_instruction_tokens_per_trial": backend.system_instruction_tokens / n if n else 0.0,
+        "store_rows": rows,
+        "peak_memory_bytes": peak_bytes,
+    }
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the lab extraction pipeline on synthetic trials.")
+    parser.add_argument("--sizes", default="10,1000,100000", help="Comma-separated trial counts")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.02, help="Extra random latency in seconds")
+    parser.add_argument("--max-workers", type=int, default=32)
+    parser.add_argument("--batch-token-budget", type=int, default=None)
+    parser.add_argument("--fused", action="store_true", help="Extract and normalize in one call per trial")
+    parser.add_argument("--criteria-sentences", type=int, default=20)
+    parser.add_argument("--lab-density", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-tracemalloc", dest="tracemalloc", action="store_false", help="Skip peak memory tracking")
+    parser.add_argument("--output", default=None, help="JSON file for the results (default results/benchmarks/<timestamp>.json)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    results = {"settings": {key: value for key, value in vars(args).items() if key != "output"}, "runs": []}
+    for n in [int(size) for size in args.sizes.split(",") if size]:
+        run = run_size(n, args)
+        results["runs"].append(run)
+        latency = run["call_latency_seconds"]
+        print(f"{n:>7} trials: {run['throughput_trials_per_second']:.1f} trials/s, "
+              f"call p50/p95/p99 {latency['p50'] * 1000:.0f}/{latency['p95'] * 1000:.0f}/{latency['p99'] * 1000:.0f} ms, "
+              f"{run['prompt_tokens_per_trial']:.0f} tokens/trial, peak {(run['peak_memory_bytes'] or 0) / 2**20:.1f} MiB")
+    output = args.output or os.path.join("results", "benchmarks", time.strftime("%Y%m%d-%H%M%S") + ".json")
+    if os.path.dirname(output):
+        os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}")
+
+if __name__ == "__main__":
+    main()
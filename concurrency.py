@@ -0,0 +1,121 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from metrics import metrics
+
+# Token bucket that limits how many model calls can start per second across all worker threads
+class TokenBucket:
+    def __init__(self, rate_per_second, capacity=None):
+        self.rate = float(rate_per_second)
+        self.capacity = float(capacity if capacity is not None else max(1.0, self.rate))
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# Errors worth retrying: rate limits, timeouts and server-side failures from the Gemini API, and
+# dropped or timed-out connections from the HTTP stack underneath it
+TRANSIENT_ERROR_TYPES = (TimeoutError, ConnectionError)
+try:
+    from google.api_core import exceptions as google_exceptions
+    TRANSIENT_ERROR_TYPES += (google_exceptions.TooManyRequests, google_exceptions.ResourceExhausted,
+                              google_exceptions.InternalServerError, google_exceptions.BadGateway,
+                              google_exceptions.ServiceUnavailable, google_exceptions.GatewayTimeout,
+                              google_exceptions.DeadlineExceeded)
+except ImportError:
+    pass
+try:
+    import requests
+    TRANSIENT_ERROR_TYPES += (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+except ImportError:
+    pass
+try:
+    import urllib3
+    TRANSIENT_ERROR_TYPES += (urllib3.exceptions.ProtocolError, urllib3.exceptions.TimeoutError,
+                              urllib3.exceptions.NewConnectionError)
+except ImportError:
+    pass
+
+# HTTP statuses worth retrying when an error carries one (error.code or error.response.status_code)
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# Function to decide whether an exception from a model call is transient, by its type or HTTP status
+# (never by its message, so an unrelated error that mentions "1500 rows" is not retried)
+def is_transient_error(error):
+    if isinstance(error, TRANSIENT_ERROR_TYPES):
+        return True
+    status = getattr(error, "code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return isinstance(status, int) and not isinstance(status, bool) and status in TRANSIENT_STATUS_CODES
+
+# Function to call func(item) with retries and full-jitter exponential backoff on transient errors.
+# stage labels the retry counter (extract, fused, ...).
+def call_with_retry(func, item, max_retries=3, base_delay=1.0, max_delay=30.0, rate_limiter=None, stage=""):
+    attempt = 0
+    while True:
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+        try:
+            return func(item)
+        except Exception as e:
+            if attempt >= max_retries or not is_transient_error(e):
+                raise
+            metrics.increment("retries", stage)
+            time.sleep(random.uniform(0, min(max_delay, base_delay * (2 ** attempt))))
+            attempt += 1
+
+# Function to build a token bucket from a requests-per-minute setting (None means unlimited)
+def make_rate_limiter(requests_per_minute):
+    if not requests_per_minute:
+        return None
+    return TokenBucket(requests_per_minute / 60.0)
+
+# Function to build call(func, *args, **kwargs) that runs each call under one shared rate limiter
+# with retries, for work items that make a variable number of model calls
+def limited_caller(requests_per_minute=None, max_retries=3, stage=""):
+    rate_limiter = make_rate_limiter(requests_per_minute)
+
+    def call(func, *args, **kwargs):
+        return call_with_retry(lambda _: func(*args, **kwargs), None, max_retries=max_retries, rate_limiter=rate_limiter, stage=stage)
+    return call
+
+# Function to run func over items on a thread pool, yielding (index, result) as each call completes
+def iter_concurrently(func, items, max_workers=8, requests_per_minute=None, max_retries=3, stage=""):
+    items = list(items)
+    rate_limiter = make_rate_limiter(requests_per_minute)
+    if max_workers <= 1:
+        for index, item in enumerate(items):
+            yield index, call_with_retry(func, item, max_retries=max_retries, rate_limiter=rate_limiter, stage=stage)
+        return
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = {
+            executor.submit(call_with_retry, func, item, max_retries=max_retries, rate_limiter=rate_limiter, stage=stage): index
+            for index, item in enumerate(items)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # If the consumer stops early (cancel, error, closed generator) drop the calls not yet started
+        executor.shutdown(wait=False, cancel_futures=True)
+
+# Function to run func over items concurrently and return the results in input order
+def run_concurrently(func, items, max_workers=8, requests_per_minute=None, max_retries=3, stage=""):
+    items = list(items)
+    results = [None] * len(items)
+    for index, result in iter_concurrently(func, items, max_workers, requests_per_minute, max_retries, stage):
+        results[index] = result
+    return results
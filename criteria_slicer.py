@@ -0,0 +1,63 @@
+import re
+import pandas as pd
+from lab_prefilter import LAB_TERM_PATTERN
+
+# Lines that open a section, such as "Inclusion Criteria:", "Key Exclusion Criteria", "EXCLUSION: ..."
+SECTION_START_PATTERN = re.compile(r"^\W*(?:key |main |general )?(inclusion|exclusion)(?: criteria)?\b", re.IGNORECASE)
+# Short header lines; a line is only a bare header when nothing after the header word is a lab term or number
+SECTION_HEADER_PATTERN = re.compile(SECTION_START_PATTERN.pattern + r"[^.]{0,40}$", re.IGNORECASE)
+SENTENCE_SPLIT_PATTERN = re.compile(r"(?<=[.;])\s+(?=[A-Z(\\*-])")
+NUMBER_PATTERN = re.compile(r"\d")
+
+# Rough token estimate (about 4 characters per token for English text)
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+# Function to tell a bare section header ("Exclusion Criteria:") from a criteria line that
+# starts with the header word ("Exclusion criteria: creatinine > 1.5 mg/dL")
+def is_section_header(line):
+    match = SECTION_HEADER_PATTERN.match(line)
+    if match is None:
+        return False
+    rest = line[SECTION_START_PATTERN.match(line).end():]
+    return not LAB_TERM_PATTERN.search(rest) and not NUMBER_PATTERN.search(rest)
+
+# Function to keep only the section headers and the sentences that mention a target lab.
+# The headers stay because the exclusion-reversal rule in the prompt depends on them; a line
+# that mentions a lab is never dropped.
+def slice_criteria_text(text):
+    kept = []  # (line, is bare header)
+    for line in str(text).splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        section_start = SECTION_START_PATTERN.match(stripped)
+        if is_section_header(stripped):
+            kept.append((stripped, True))
+        elif LAB_TERM_PATTERN.search(stripped):
+            if section_start:
+                # Header and criteria on one line: keep it whole so the section context stays with the lab
+                kept.append((stripped, False))
+            else:
+                sentences = [s for s in SENTENCE_SPLIT_PATTERN.split(stripped) if LAB_TERM_PATTERN.search(s)]
+                kept.append((" ".join(sentences), False))
+        elif section_start:
+            # Header followed by criteria without a lab: keep just the header words
+            kept.append((section_start.group(0), True))
+    # Drop a bare header with no lab lines before the next section (or the end of the text)
+    sliced = [line for i, (line, header) in enumerate(kept)
+              if not (header and (i + 1 == len(kept) or kept[i + 1][1] or SECTION_START_PATTERN.match(kept[i + 1][0])))]
+    return "\n".join(sliced)
+
+# Function to slice a column of texts and report per-trial token savings
+def slice_criteria(texts, nct_ids=None):
+    sliced = texts.fillna("").astype(str).map(slice_criteria_text)
+    original_tokens = texts.fillna("").astype(str).str.len() // 4 + 1
+    sliced_tokens = sliced.str.len() // 4 + 1
+    savings = pd.DataFrame({
+        "NCTId": nct_ids if nct_ids is not None else texts.index,
+        "original_tokens": original_tokens,
+        "sliced_tokens": sliced_tokens,
+        "saved_tokens": original_tokens - sliced_tokens,
+    }, index=texts.index)
+    return sliced, savings
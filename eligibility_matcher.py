@@ -0,0 +1,114 @@
+import numpy as np
+from lab_normalizer import LAB_STANDARDS
+from lab_store import LabRequirementStore
+
+LABS = list(LAB_STANDARDS)
+
+# Per-lab interval index: trial bounds sorted by lower and by upper, so a point query only
+# looks at the trials on the short side of the value instead of scanning every trial.
+class LabIntervalIndex:
+    def __init__(self, trial_positions, lower, upper):
+        lower = np.where(np.isnan(lower), -np.inf, lower)
+        upper = np.where(np.isnan(upper), np.inf, upper)
+        self.positions = trial_positions
+        self.lower, self.upper = lower, upper
+        self.by_lower = np.argsort(lower, kind="stable")
+        self.sorted_lower = lower[self.by_lower]
+        self.by_upper = np.argsort(upper, kind="stable")
+        self.sorted_upper = upper[self.by_upper]
+
+    # Positions (into the matcher's trial list) of constrained trials whose range contains value
+    def accepting(self, value):
+        low_count = np.searchsorted(self.sorted_lower, value, side="right")   # lower <= value
+        high_start = np.searchsorted(self.sorted_upper, value, side="left")   # upper >= value
+        if low_count <= len(self.sorted_upper) - high_start:
+            candidates = self.by_lower[:low_count]
+            candidates = candidates[self.upper[candidates] >= value]
+        else:
+            candidates = self.by_upper[high_start:]
+            candidates = candidates[self.lower[candidates] <= value]
+        return np.sort(self.positions[candidates])
+
+# Matches patient lab panels against every trial's normalized ranges. Bounds are held in
+# (trials x labs) float arrays with NaN meaning "no constraint".
+class EligibilityMatcher:
+    def __init__(self, nct_ids, lower, upper, labs=LABS):
+        self.nct_ids = np.asarray(nct_ids, dtype=object)
+        self.labs = list(labs)
+        self.lab_positions = {lab: i for i, lab in enumerate(self.labs)}
+        self.lower = np.asarray(lower, dtype=np.float64)
+        self.upper = np.asarray(upper, dtype=np.float64)
+        self.constrained = ~(np.isnan(self.lower) & np.isnan(self.upper))
+        self.interval_indexes = {}
+
+    # Function to build the matcher from the database-ready rows of a LabRequirementStore.
+    # The trial axis is nct_ids (every processed trial) followed by any other trial in the store;
+    # trials without database-ready rows get all-NaN bounds, i.e. no lab constraint.
+    @classmethod
+    def from_store(cls, store, labs=LABS, nct_ids=None):
+        frame = store.frame
+        known = list(nct_ids) if nct_ids is not None else []
+        nct_ids = np.asarray(list(dict.fromkeys(known + frame['NCTId'].tolist())), dtype=object)
+        frame = frame[(frame['kind'] == "database_ready") & frame['lab'].isin(labs)]
+        trial_positions = {nct_id: i for i, nct_id in enumerate(nct_ids)}
+        lab_positions = {lab: i for i, lab in enumerate(labs)}
+        lower = np.full((len(nct_ids), len(labs)), np.nan)
+        upper = np.full((len(nct_ids), len(labs)), np.nan)
+        rows = frame['NCTId'].map(trial_positions).to_numpy(dtype=np.int64)
+        columns = frame['lab'].astype(str).map(lab_positions).to_numpy(dtype=np.int64)
+        lower[rows, columns] = frame['lower'].to_numpy()
+        upper[rows, columns] = frame['upper'].to_numpy()
+        return cls(nct_ids, lower, upper, labs)
+
+    # Function to build the matcher from prepare_database_ready_answers output, one trial per record
+    @classmethod
+    def from_records(cls, records, column_name="DatabaseReadyLabValues", labs=LABS):
+        store = LabRequirementStore().add_records(records, column_name=column_name, kind="database_ready")
+        return cls.from_store(store, labs, nct_ids=[record["NCTId"] for record in records])
+
+    # Function to turn {lab: value} panels into a (patients x labs) array, NaN for labs not measured
+    def panel_array(self, panels):
+        if isinstance(panels, dict):
+            panels = [panels]
+        values = np.full((len(panels), len(self.labs)), np.nan)
+        for row, panel in enumerate(panels):
+            for lab, value in panel.items():
+                if lab in self.lab_positions and value is not None:
+                    values[row, self.lab_positions[lab]] = value
+        return values
+
+    # Boolean (patients x trials) eligibility matrix. A lab the patient has no value for
+    # only passes when the trial does not constrain it, unless missing_ok=True.
+    def eligibility(self, panels, missing_ok=False, chunk_size=1024):
+        values = panels if isinstance(panels, np.ndarray) else self.panel_array(panels)
+        result = np.empty((values.shape[0], len(self.nct_ids)), dtype=bool)
+        lower, upper, constrained = self.lower[None], self.upper[None], self.constrained[None]
+        for start in range(0, values.shape[0], chunk_size):
+            chunk = values[start:start + chunk_size, None, :]
+            with np.errstate(invalid="ignore"):
+                within = (np.isnan(lower) | (chunk >= lower)) & (np.isnan(upper) | (chunk <= upper))
+            missing = np.isnan(chunk)
+            passes = np.where(missing, missing_ok | ~constrained, within)
+            result[start:start + chunk_size] = passes.all(axis=2)
+        return result
+
+    # Function to list eligible NCTIds for one panel (dict) or for each panel in a list
+    def eligible_trials(self, panels, missing_ok=False):
+        matrix = self.eligibility(panels, missing_ok)
+        matches = [self.nct_ids[row].tolist() for row in matrix]
+        return matches[0] if isinstance(panels, dict) else matches
+
+    def interval_index(self, lab):
+        if lab not in self.interval_indexes:
+            column = self.lab_positions[lab]
+            positions = np.flatnonzero(self.constrained[:, column])
+            self.interval_indexes[lab] = LabIntervalIndex(positions, self.lower[positions, column], self.upper[positions, column])
+        return self.interval_indexes[lab]
+
+    # Function to answer "which trials accept this value for this lab" from the interval index
+    def trials_accepting(self, lab, value, include_unconstrained=False):
+        positions = self.interval_index(lab).accepting(value)
+        if include_unconstrained:
+            unconstrained = np.flatnonzero(~self.constrained[:, self.lab_positions[lab]])
+            positions = np.union1d(positions, unconstrained)
+        return self.nct_ids[positions].tolist()
@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import pandas as pd
+import fused_extraction
+import module1
+import module2
+from lab_normalizer import LAB_KEY_ALIASES, LAB_STANDARDS, OPERATOR_PHRASES, UNIT_CONVERSIONS
+
+# Content-hash manifest of extracted trials: one "NCTId<TAB>hash" line per trial, appended as
+# chunks finish (the last line for an NCTId wins). The hash covers concatenated_text, i.e. every
+# field that feeds the model, plus the pipeline fingerprint, so editing a prompt or a normalizer
+# table invalidates every entry.
+
+# Hash of entries taken over from the old .done checkpoint: it never matches a real hash, so those
+# trials count as modified and are extracted again under the current pipeline
+LEGACY_HASH = "legacy"
+
+# Function to fingerprint everything besides the trial text that shapes a record: the prompts and
+# preambles of both stages and the rule-based normalizer's standards, conversions and operators
+def pipeline_fingerprint(fused=False):
+    # The fused mode falls back to the two-stage prompts, so those are part of both fingerprints
+    prompts = [module1.LAB_VALUES_PROMPT, module1.BATCH_INSTRUCTION, module1.SAFETY_PREAMBLE,
+               module2.NORMALIZE_PROMPT, module2.SAFETY_PREAMBLE]
+    if fused:
+        prompts += [fused_extraction.FUSED_PROMPT, fused_extraction.SAFETY_PREAMBLE]
+    tables = json.dumps([LAB_STANDARDS, UNIT_CONVERSIONS, OPERATOR_PHRASES, LAB_KEY_ALIASES], sort_keys=True)
+    return hashlib.sha256("\0".join(prompts + [tables]).encode("utf-8")).hexdigest()[:16]
+
+# Function to hash each trial's concatenated_text together with the pipeline fingerprint
+def content_hashes(df, fingerprint=""):
+    prefix = fingerprint.encode("utf-8") + b"\0"
+    return pd.Series([hashlib.sha256(prefix + text.encode("utf-8")).hexdigest() for text in df['concatenated_text']],
+                     index=df.index)
+
+def manifest_path(output):
+    return output.rstrip("/\\") + ".manifest.tsv"
+
+class ExtractionManifest:
+    def __init__(self, path):
+        self.path = path
+        self.hashes = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    nct_id, _, digest = line.rstrip("\n").partition("\t")
+                    if nct_id and digest:
+                        self.hashes[nct_id] = digest
+
+    def __contains__(self, nct_id):
+        return nct_id in self.hashes
+
+    # Function to split a frame into reusable trials (hash unchanged) and trials to (re)compute.
+    # Returns (pending frame, {"reused", "new", "modified", "removed"} counts).
+    def diff(self, df, hashes):
+        previous = df['NCTId'].map(self.hashes)
+        new = previous.isna().to_numpy()
+        modified = ~new & (previous.to_numpy() != hashes)
+        removed = len(set(self.hashes) - set(df['NCTId']))
+        counts = {"reused": int((~new & ~modified).sum()), "new": int(new.sum()),
+                  "modified": int(modified.sum()), "removed": removed}
+        return df[new | modified], counts
+
+    # Function to record finished trials; the file is fsynced so it can double as a checkpoint
+    def record(self, nct_ids, hashes):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for nct_id, digest in zip(nct_ids, hashes):
+                f.write(f"{nct_id}\t{digest}\n")
+                self.hashes[nct_id] = digest
+            f.flush()
+            os.fsync(f.fileno())
+
+    # Function to rewrite the manifest with one line per trial still in the dataset
+    def compact(self, nct_ids):
+        keep = {nct_id: self.hashes[nct_id] for nct_id in nct_ids if nct_id in self.hashes}
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            f.writelines(f"{nct_id}\t{digest}\n" for nct_id, digest in keep.items())
+        os.replace(temporary, self.path)
+        self.hashes = keep
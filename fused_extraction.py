@@ -0,0 +1,127 @@
+import json
+import numbers
+from concurrency import iter_concurrently, limited_caller
+from lab_normalizer import (LAB_STANDARDS, STANDARD_RANGES_TEXT, UnparseableLabValue, canonical_lab_name, load_lab_values_json,
+                           normalize_entry, validate_range)
+from lab_prefilter import EMPTY_LAB_VALUES
+from metrics import metrics
+from model_client import ask_model
+from module1 import LAB_VALUES_PROMPT, SAFETY_PREAMBLE, generate_text, prepare_extraction_frame
+from module2 import NORMALIZE_PROMPT, normalize_record, generate_text as normalize_text
+
+# Fused mode: one model call per trial returns both the extracted relationship and the numeric
+# range, instead of an extraction call followed by a normalization call.
+
+FUSED_INSTRUCTION = """
+Return both the extracted relationship and its numeric range in the lab's standard unit, using this schema for every lab value:
+"Lab Value required": {"relation": "Extracted relationship", "value": "Extracted Lab Value", "range": [lower, upper]}
+
+The range follows the extracted relationship after any exclusion-criteria reversal:
+- "greater than" becomes [value + one step, range upper]; "greater than or equal to" becomes [value, range upper].
+- "less than" becomes [range lower, value - one step]; "less than or equal to" becomes [range lower, value].
+- Lower and upper limits become [lower limit, upper limit]; a lab with no value has "range": null.
+
+Standard Units and Ranges:
+""" + STANDARD_RANGES_TEXT + """
+
+Example Format:
+{
+"Hemoglobin required": {"relation": "less than or equal to", "value": "90 g/L", "range": [0.0, 90.0]},
+"Hematocrit required": {"relation": "", "value": "", "range": null}
+}
+Return only the JSON object.
+Text is as under:"""
+
+FUSED_PROMPT = LAB_VALUES_PROMPT.removesuffix("Text is as under:") + FUSED_INSTRUCTION
+
+# Function to check a fused response against the schema; returns ({lab: [relation, value]}, {lab: model range})
+def validate_fused_response(response_text):
+    data = load_lab_values_json(response_text)
+    if not isinstance(data, dict):
+        raise UnparseableLabValue(f"Expected a JSON object, got {type(data).__name__}")
+    lab_values, model_ranges = {}, {}
+    for key, entry in data.items():
+        lab = canonical_lab_name(key)
+        if lab is None:
+            continue
+        if isinstance(entry, (list, tuple)) and len(entry) == 2:
+            # Plain [relationship, value] pair without a range; the local rules normalize it
+            entry = {"relation": entry[0], "value": entry[1]}
+        if not isinstance(entry, dict) or not isinstance(entry.get("relation") or "", str):
+            raise UnparseableLabValue(f"Entry for {lab} does not match the fused schema: {entry!r}")
+        value = entry.get("value")
+        if value is not None and not isinstance(value, (str, numbers.Real)):
+            raise UnparseableLabValue(f"Value for {lab} is not a string or number: {value!r}")
+        lab_values[lab] = [entry.get("relation") or "", "" if value is None else str(value)]
+        lab_range = entry.get("range")
+        if lab_range is not None:
+            if not (isinstance(lab_range, list) and len(lab_range) == 2
+                    and all(isinstance(bound, numbers.Real) and not isinstance(bound, bool) for bound in lab_range)):
+                raise UnparseableLabValue(f"Range for {lab} is not a [lower, upper] pair: {lab_range!r}")
+            model_ranges[lab] = [float(bound) for bound in lab_range]
+    return lab_values, model_ranges
+
+# Function to derive the database-ready ranges: the local rules win, the model's range is used
+# only where they cannot parse the value and it passes the same range check
+def database_ready_ranges(lab_values, model_ranges):
+    ranges = {}
+    for lab, entry in lab_values.items():
+        try:
+            lab_range = normalize_entry(lab, entry)
+        except (UnparseableLabValue, ValueError):
+            try:
+                lab_range = validate_range(lab, model_ranges[lab]) if lab in model_ranges else None
+            except UnparseableLabValue:
+                lab_range = None
+        if lab_range is not None:
+            ranges[lab] = lab_range
+    return ranges
+
+# Function to extract and normalize one trial in a single call. A response that fails the schema
+# falls back to the two-call path, so the trial still gets both outputs. Every model call goes
+# through call(func, *args, **kwargs), e.g. a limited_caller, so fallback calls share its rate limit and retries.
+def extract_and_normalize_text(nct_id, text, use_cache=True, call=None, timeout=None):
+    call = call or (lambda func, *args, **kwargs: func(*args, **kwargs))
+    response = call(ask_model, FUSED_PROMPT, text, SAFETY_PREAMBLE, "fused", use_cache=use_cache, timeout=timeout)
+    try:
+        lab_values, model_ranges = validate_fused_response(response)
+    except UnparseableLabValue:
+        metrics.increment("schema_failures", "fused")
+        lab_values_text = call(generate_text, LAB_VALUES_PROMPT, text, use_cache=use_cache, timeout=timeout)
+        ready = normalize_record(NORMALIZE_PROMPT, lab_values_text, use_cache=use_cache,
+                                 generate=lambda prompt, content, use_cache=True: call(normalize_text, prompt, content,
+                                                                                       use_cache=use_cache, timeout=timeout))
+        return {"NCTId": nct_id, "LAB_VALUES": lab_values_text, "DatabaseReadyLabValues": ready}
+    return {
+        "NCTId": nct_id,
+        "LAB_VALUES": json.dumps({lab: lab_values.get(lab, ["", ""]) for lab in LAB_STANDARDS}),
+        "DatabaseReadyLabValues": json.dumps(database_ready_ranges(lab_values, model_ranges)),
+    }
+
+# Streaming fused mode: yields {"NCTId", "LAB_VALUES", "DatabaseReadyLabValues"} per trial as soon as it is ready.
+# Trials skipped by the prefilter come first; the rest follow in completion order.
+def iter_extract_and_normalize(df, max_workers=8, requests_per_minute=None, max_retries=3, use_cache=True,
+                               prefilter=True, slice_text=True, stats=None, timeout=None):
+    df, needs_model = prepare_extraction_frame(df, prefilter, slice_text, stats)
+    for nct_id in df.loc[~needs_model, 'NCTId']:
+        yield {"NCTId": nct_id, "LAB_VALUES": EMPTY_LAB_VALUES, "DatabaseReadyLabValues": "{}"}
+    to_extract = df[needs_model]
+    # Rate limiting and retries apply per model call, so a fallback's extra calls are limited too
+    call = limited_caller(requests_per_minute, max_retries, "fused")
+    for _, record in iter_concurrently(
+        lambda row: extract_and_normalize_text(row[0], row[1], use_cache=use_cache, call=call, timeout=timeout),
+        list(zip(to_extract['NCTId'], to_extract['concatenated_text'])),
+        max_workers=max_workers,
+        max_retries=0,
+        stage="fused",
+    ):
+        yield record
+
+# Function to run fused mode over a frame; returns the extract_lab_values and
+# prepare_database_ready_answers outputs, both in input order
+def extract_and_normalize(df, **kwargs):
+    records = {record["NCTId"]: record for record in iter_extract_and_normalize(df, **kwargs)}
+    ordered = [records[nct_id] for nct_id in df['NCTId']]
+    lab_values = [{"NCTId": record["NCTId"], "LAB_VALUES": record["LAB_VALUES"]} for record in ordered]
+    database_ready = [{"NCTId": record["NCTId"], "DatabaseReadyLabValues": record["DatabaseReadyLabValues"]} for record in ordered]
+    return lab_values, database_ready
@@ -0,0 +1,227 @@
+import json
+import re
+
+# Standard unit, allowed range and rounding step for each lab in the module1 extraction prompt.
+# Ranges follow the module2 rules: "greater than v" -> [v + step, max], "less than v" -> [min, v - step].
+LAB_STANDARDS = {
+    "Hemoglobin required": {"unit": "g/L", "min": 0.0, "max": 250.0, "step": 1.0},
+    "Hematocrit required": {"unit": "%", "min": 0.0, "max": 100.0, "step": 0.1},
+    "Platelet count required": {"unit": "x10^9/L", "min": 0.0, "max": 1500.0, "step": 1.0},
+    "White blood cell required": {"unit": "x10^9/L", "min": 0.0, "max": 99.9, "step": 0.1},
+    "Absolute neutrophil count (ANC) or absolute granulocyte count required": {"unit": "x10^9/L", "min": 0.0, "max": 9.9, "step": 0.1},
+    "Creatinine required": {"unit": "mg/dL", "min": 0.0, "max": 20.0, "step": 0.01},
+    "Creatinine clearance or GFR required": {"unit": "ml/min", "min": 0.0, "max": 200.0, "step": 1.0},
+    "AST required": {"unit": "xULN", "min": 0.0, "max": 99.9, "step": 0.1},
+    "ALT required": {"unit": "xULN", "min": 0.0, "max": 99.9, "step": 0.1},
+    "Albumin required": {"unit": "g/L", "min": 0.0, "max": 60.0, "step": 1.0},
+    "Alkaline phosphatase required": {"unit": "xULN", "min": 0.0, "max": 99.9, "step": 0.1},
+    "Bilirubin required": {"unit": "xULN", "min": 0.0, "max": 99.9, "step": 0.1},
+}
+
+# Unit label as shown in table column names, e.g. "Hemoglobin required (g/L)"
+STANDARD_UNITS = {lab: spec["unit"] for lab, spec in LAB_STANDARDS.items()}
+
+# Unit, range and step of every lab as listed in the model prompts, so the model fallback
+# applies the same steps as the local rules
+STANDARD_RANGES_TEXT = "\n".join(
+    f"- {lab}: {spec['unit']}, range [{spec['min']}, {spec['max']}], step {spec['step']}" for lab, spec in LAB_STANDARDS.items()
+)
+
+# Alternative key spellings the model sometimes returns, mapped to the canonical keys above
+LAB_KEY_ALIASES = {
+    "white blood cell count required": "White blood cell required",
+    "wbc required": "White blood cell required",
+    "anc required": "Absolute neutrophil count (ANC) or absolute granulocyte count required",
+    "absolute neutrophil count required": "Absolute neutrophil count (ANC) or absolute granulocyte count required",
+    "platelets required": "Platelet count required",
+    "creatinine clearance required": "Creatinine clearance or GFR required",
+    "gfr required": "Creatinine clearance or GFR required",
+    "total bilirubin required": "Bilirubin required",
+}
+
+# Conversion factors from a normalized unit spelling to each standard unit
+UNIT_CONVERSIONS = {
+    "x10^9/L": {
+        "x10^9/l": 1.0, "10^9/l": 1.0, "x109/l": 1.0, "109/l": 1.0, "g/l": 1.0, "/nl": 1.0,
+        "x10^3/ul": 1.0, "10^3/ul": 1.0, "x103/ul": 1.0, "k/ul": 1.0, "x10^3/mm3": 1.0, "10^3/mm3": 1.0,
+        "/mm3": 0.001, "cells/mm3": 0.001, "/ul": 0.001, "cells/ul": 0.001,
+        "x10^6/l": 0.001,
+    },
+    "g/L": {"g/l": 1.0, "g/dl": 10.0, "mg/dl": 0.01, "mg/ml": 1.0},
+    "%": {"%": 1.0, "percent": 1.0, "l/l": 100.0},
+    "mg/dL": {"mg/dl": 1.0, "umol/l": 1 / 88.4, "mmol/l": 1000 / 88.4, "mg/l": 0.1},
+    "ml/min": {"ml/min": 1.0, "ml/min/1.73m2": 1.0, "ml/min/1.73m^2": 1.0, "ml/min/1.73": 1.0, "ml/s": 60.0},
+    "xULN": {"xuln": 1.0, "uln": 1.0},
+}
+
+# Relationship phrases mapped to the operators used by the module2 transformation rules
+OPERATOR_PHRASES = [
+    ("greater than or equal to", ">="), ("more than or equal to", ">="), ("at least", ">="),
+    ("less than or equal to", "<="), ("no more than", "<="), ("not more than", "<="), ("at most", "<="),
+    ("up to", "<="), ("greater than", ">"), ("more than", ">"), ("above", ">"), ("higher than", ">"),
+    ("less than", "<"), ("below", "<"), ("lower than", "<"), ("under", "<"),
+    (">=", ">="), ("=>", ">="), ("≥", ">="), ("<=", "<="), ("=<", "<="), ("≤", "<="),
+    (">", ">"), ("<", "<"),
+]
+
+NUMBER_PATTERN = re.compile(r"(\d{1,3}(?:,\d{3})+|\d+(?:[.,]\d+)?|\.\d+)")
+
+# Raised for any value the rule engine cannot map with confidence
+class UnparseableLabValue(ValueError):
+    pass
+
+# Function to pull the JSON object out of a model response (which may be wrapped in ``` fences)
+def load_lab_values_json(text):
+    if isinstance(text, dict):
+        return text
+    text = (text or "").strip()
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end <= start:
+        raise UnparseableLabValue(f"No JSON object found in: {text[:80]!r}")
+    try:
+        return json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise UnparseableLabValue(str(e))
+
+# Function to map a returned key to its canonical lab name (None for labs outside the list)
+def canonical_lab_name(key):
+    if key in LAB_STANDARDS:
+        return key
+    lowered = key.strip().lower()
+    for lab in LAB_STANDARDS:
+        if lab.lower() == lowered:
+            return lab
+    return LAB_KEY_ALIASES.get(lowered)
+
+# Function to turn a relationship phrase or symbol into >, >=, < or <=
+def parse_operator(relation):
+    relation = (relation or "").strip().lower()
+    for phrase, operator in OPERATOR_PHRASES:
+        if relation.startswith(phrase):
+            return operator, relation[len(phrase):].strip()
+    return None, relation
+
+def parse_number(token):
+    if re.fullmatch(r"\d{1,3}(?:,\d{3})+", token):
+        return float(token.replace(",", ""))
+    return float(token.replace(",", "."))
+
+def normalize_unit(unit):
+    unit = unit.strip().lower()
+    unit = unit.replace("×", "x").replace("³", "3").replace("µ", "u").replace("μ", "u")
+    unit = unit.replace("⁹", "^9").replace("mcl", "ul").replace("cu mm", "mm3").replace("mm^3", "mm3")
+    unit = re.sub(r"\s+", "", unit).rstrip(".,;)")
+    unit = re.sub(r"^(x)?10\*\*?", r"\g<1>10^", unit)
+    # "x ULN", "times the upper limit of normal", "x institutional ULN" all mean multiples of ULN
+    if re.fullmatch(r"(x|times)?(the)?(institutional)?(uln|upperlimitofnormal)", unit):
+        unit = "xuln"
+    return unit
+
+# Function to split "1.5 x10^9/L" into its number and normalized unit ("" when no unit is given)
+def split_quantity(value):
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value), ""
+    match = NUMBER_PATTERN.search(str(value))
+    if match is None or str(value)[:match.start()].strip():
+        raise UnparseableLabValue(f"No leading number in {value!r}")
+    return parse_number(match.group(1)), normalize_unit(str(value)[match.end():])
+
+# Function to convert a number in the given unit to the lab's standard unit. A number without a
+# unit is rejected rather than assumed to be in the standard unit ("Hemoglobin >= 9" usually means g/dL).
+def convert_quantity(number, unit, lab):
+    standard = LAB_STANDARDS[lab]["unit"]
+    if not unit:
+        raise UnparseableLabValue(f"No unit given for {lab}: {number:g}")
+    factor = UNIT_CONVERSIONS[standard].get(unit)
+    if factor is None:
+        raise UnparseableLabValue(f"Cannot convert {unit!r} to {standard} for {lab}")
+    return number * factor
+
+# Function to parse "1.5 x10^9/L" into a value converted to the lab's standard unit
+def parse_quantity(value, lab):
+    return convert_quantity(*split_quantity(value), lab)
+
+# Function to parse lower and upper limits such as ["1.5", "9.0 x10^9/L"], where one unit covers both
+def parse_limits(lower, upper, lab):
+    (low, low_unit), (high, high_unit) = split_quantity(lower), split_quantity(upper)
+    return convert_quantity(low, low_unit or high_unit, lab), convert_quantity(high, high_unit or low_unit, lab)
+
+def round_to_step(value, step):
+    decimals = max(0, len(f"{step:g}".partition(".")[2]))
+    return round(value, decimals)
+
+# Function to check a [lower, upper] range against the lab's standard range. Bounds outside the
+# range are clamped to it; a range that is empty after clamping (lower > upper) is rejected.
+def validate_range(lab, lab_range):
+    spec = LAB_STANDARDS[lab]
+    if not (isinstance(lab_range, (list, tuple)) and len(lab_range) == 2
+            and all(isinstance(bound, (int, float)) and not isinstance(bound, bool) for bound in lab_range)):
+        raise UnparseableLabValue(f"Range for {lab} is not a [lower, upper] pair: {lab_range!r}")
+    lower, upper = max(float(lab_range[0]), spec["min"]), min(float(lab_range[1]), spec["max"])
+    if lower > upper:
+        raise UnparseableLabValue(f"Range for {lab} is empty within [{spec['min']}, {spec['max']}]: {lab_range!r}")
+    return [round_to_step(lower, spec["step"]), round_to_step(upper, spec["step"])]
+
+# Function to apply the operator-to-range rules to a single [relationship, value] pair
+def normalize_entry(lab, entry):
+    spec = LAB_STANDARDS[lab]
+    if not isinstance(entry, (list, tuple)) or len(entry) != 2:
+        raise UnparseableLabValue(f"Expected a [relationship, value] pair for {lab}: {entry!r}")
+    relation, value = entry
+    if relation in ("", None) and value in ("", None):
+        return None
+    operator, remainder = parse_operator(relation if isinstance(relation, str) else "")
+    if operator is None and isinstance(value, str):
+        operator, value = parse_operator(value)
+        value = value or remainder
+    if operator is None:
+        # Lab value lower and upper limits, e.g. ["1.5", "9.0 x10^9/L"] or [1.5, 9.0]
+        lower, upper = parse_limits(relation, value, lab)
+    else:
+        quantity = parse_quantity(value, lab)
+        step = spec["step"]
+        if operator == ">":
+            lower, upper = quantity + step, spec["max"]
+        elif operator == ">=":
+            lower, upper = quantity, spec["max"]
+        elif operator == "<":
+            lower, upper = spec["min"], quantity - step
+        else:
+            lower, upper = spec["min"], quantity
+    return validate_range(lab, [lower, upper])
+
+# Function to check the {lab: [lower, upper]} ranges in a model response (JSON text, possibly fenced).
+# Keys outside the lab list, ranges that fail validate_range and labs not in labs (when given) are
+# dropped; a response without a JSON object gives {}.
+def validated_model_ranges(model_output, labs=None):
+    try:
+        model_ranges = load_lab_values_json(model_output)
+    except UnparseableLabValue:
+        return {}
+    ranges = {}
+    for key, lab_range in model_ranges.items():
+        lab = canonical_lab_name(key) if isinstance(key, str) else None
+        if lab is None or (labs is not None and lab not in labs):
+            continue
+        try:
+            ranges[lab] = validate_range(lab, lab_range)
+        except UnparseableLabValue:
+            pass
+    return ranges
+
+# Function to normalize a LAB_VALUES response into {lab: [lower, upper]} plus the entries it could not parse
+def normalize_lab_values(lab_values_text):
+    lab_values = load_lab_values_json(lab_values_text)
+    normalized, unparsed = {}, {}
+    for key, entry in lab_values.items():
+        lab = canonical_lab_name(key)
+        if lab is None:
+            continue
+        try:
+            lab_range = normalize_entry(lab, entry)
+        except (UnparseableLabValue, ValueError):
+            unparsed[lab] = entry
+            continue
+        if lab_range is not None:
+            normalized[lab] = lab_range
+    return normalized, unparsed
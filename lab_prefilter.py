@@ -0,0 +1,40 @@
+import json
+import re
+from lab_normalizer import LAB_STANDARDS
+
+# Names, synonyms and abbreviations of each of the 12 labs in the extraction prompt
+LAB_SYNONYMS = {
+    "Hemoglobin required": [r"ha?emoglobin", r"hgb", r"hb"],
+    "Hematocrit required": [r"ha?ematocrit", r"hct"],
+    "Platelet count required": [r"platelets?", r"plt", r"thrombocytes?"],
+    "White blood cell required": [r"white blood cells?", r"wbc", r"leu[ck]ocytes?"],
+    "Absolute neutrophil count (ANC) or absolute granulocyte count required": [r"neutrophils?", r"anc", r"granulocytes?", r"agc"],
+    "Creatinine required": [r"creatinine"],
+    "Creatinine clearance or GFR required": [r"creatinine clearance", r"crcl", r"e?gfr", r"glomerular filtration"],
+    "AST required": [r"ast", r"sgot", r"aspartate (?:amino)?transferase", r"aspartate transaminase", r"transaminases?"],
+    "ALT required": [r"alt", r"sgpt", r"alanine (?:amino)?transferase", r"alanine transaminase", r"transaminases?"],
+    "Albumin required": [r"albumin"],
+    "Alkaline phosphatase required": [r"alkaline phosphatase", r"alk phos", r"alp"],
+    "Bilirubin required": [r"bilirubin"],
+}
+
+# Units and ULN phrasing that only appear next to a lab threshold
+LAB_UNIT_TERMS = [
+    r"uln", r"upper limits? of (?:the )?normal",
+    r"g/dl", r"mg/dl", r"[µμu]mol/l", r"ml/min", r"/mm3", r"/mm³", r"x?10(?:\^?9|⁹)", r"x?10(?:\^?3|³)/[µμu]l",
+]
+
+# A trial that matches none of these terms cannot yield a lab value, so it does not need a model call
+LAB_TERMS = [term for terms in LAB_SYNONYMS.values() for term in terms] + LAB_UNIT_TERMS
+
+LAB_TERM_PATTERN = re.compile(r"\b(?:" + "|".join(LAB_TERMS) + r")(?![a-z])", re.IGNORECASE)
+LAB_NAME_PATTERNS = {
+    lab: re.compile(r"\b(?:" + "|".join(terms) + r")(?![a-z])", re.IGNORECASE) for lab, terms in LAB_SYNONYMS.items()
+}
+
+# Result returned for trials skipped by the prefilter, in the same shape as a model response
+EMPTY_LAB_VALUES = json.dumps({lab: ["", ""] for lab in LAB_STANDARDS})
+
+# Function to flag, for a whole column at once, which texts mention any lab term
+def has_lab_terms(texts):
+    return texts.fillna("").astype(str).str.contains(LAB_TERM_PATTERN, regex=True)
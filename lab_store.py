@@ -0,0 +1,207 @@
+import os
+import re
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from criteria_slicer import SECTION_START_PATTERN
+from lab_normalizer import (STANDARD_UNITS, UnparseableLabValue, canonical_lab_name, load_lab_values_json,
+                            parse_limits, parse_operator, parse_quantity)
+from lab_prefilter import LAB_NAME_PATTERNS
+
+# Advisory file locks: fcntl on POSIX, msvcrt on Windows
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Regex fallbacks for model output that is not valid JSON (the patterns parse_output used to apply)
+PAIR_PATTERN = re.compile(r'"([^"]+ required)"\s*:\s*\["([^"]*)",\s*"([^"]*)"\]')
+RANGE_PATTERN = re.compile(r'"([^"]+ required)"\s*:\s*\[\s*([0-9.]+)\s*,\s*([0-9.]+)\s*\]')
+
+STORE_COLUMNS = ['NCTId', 'kind', 'lab', 'relation', 'value_text', 'operator', 'lower', 'upper', 'unit', 'section']
+
+# Function to hold an exclusive lock on path + ".lock" across threads and processes
+@contextmanager
+def file_lock(path):
+    with open(f"{path}.lock", "a+") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        else:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+            else:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+# Function to decode a model response into {key: entry}, falling back to regex when it is not valid JSON
+def decode_lab_values(text):
+    try:
+        return load_lab_values_json(text)
+    except UnparseableLabValue:
+        entries = {lab: [relation, value] for lab, relation, value in PAIR_PATTERN.findall(text or "")}
+        entries.update({lab: [float(lower), float(upper)] for lab, lower, upper in RANGE_PATTERN.findall(text or "")})
+        return entries
+
+# Function to find whether a lab is first mentioned under the inclusion or exclusion header of the trial text
+def infer_section(trial_text, lab):
+    if not trial_text:
+        return ""
+    section = ""
+    for line in str(trial_text).splitlines():
+        # A header line may carry criteria too ("Exclusion criteria: creatinine > 1.5 mg/dL")
+        line = line.strip()
+        header = SECTION_START_PATTERN.match(line)
+        if header:
+            section = header.group(1).lower()
+        if LAB_NAME_PATTERNS[lab].search(line[header.end():] if header else line):
+            return section
+    return ""
+
+# Typed, columnar store of extracted lab requirements: one row per (trial, kind, lab).
+# kind is "extracted" for LAB_VALUES relations and "database_ready" for normalized ranges;
+# lower/upper are float64 in the lab's standard unit with NaN for an open bound.
+class LabRequirementStore:
+    def __init__(self, frame=None):
+        self.rows = []
+        # (NCTId, kind) of every response added, including those that yielded no rows
+        self.processed = set()
+        self.frame_cache = frame if frame is not None else self.empty_frame()
+        self.dirty = False
+
+    @staticmethod
+    def empty_frame():
+        return LabRequirementStore.typed(pd.DataFrame({column: [] for column in STORE_COLUMNS}))
+
+    @staticmethod
+    def typed(frame):
+        frame = frame[STORE_COLUMNS].copy()
+        for column in ('NCTId', 'relation', 'value_text', 'unit'):
+            frame[column] = frame[column].astype(object)
+        for column in ('kind', 'lab', 'operator', 'section'):
+            frame[column] = frame[column].astype('category')
+        for column in ('lower', 'upper'):
+            frame[column] = frame[column].astype(np.float64)
+        return frame
+
+    # Function to decode one model response and append a row per lab it mentions
+    def add(self, nct_id, response_text, kind="extracted", trial_text=None):
+        self.processed.add((nct_id, kind))
+        for key, entry in decode_lab_values(response_text).items():
+            lab = canonical_lab_name(key)
+            if lab is None or not isinstance(entry, (list, tuple)) or len(entry) != 2:
+                continue
+            relation, value = entry
+            if relation in ("", None) and value in ("", None):
+                continue
+            row = {'NCTId': nct_id, 'kind': kind, 'lab': lab, 'relation': str(relation), 'value_text': str(value),
+                   'operator': "", 'lower': np.nan, 'upper': np.nan, 'unit': STANDARD_UNITS[lab],
+                   'section': infer_section(trial_text, lab)}
+            try:
+                if kind == "database_ready":
+                    row.update(operator="range", lower=float(relation), upper=float(value))
+                else:
+                    self.fill_bounds(row, lab, relation, value)
+            except (UnparseableLabValue, TypeError, ValueError):
+                # Keep the text; the bounds stay NaN and the unit is whatever the trial wrote
+                row.update(lower=np.nan, upper=np.nan, unit="")
+            self.rows.append(row)
+            self.dirty = True
+
+    @staticmethod
+    def fill_bounds(row, lab, relation, value):
+        operator, _ = parse_operator(relation if isinstance(relation, str) else "")
+        if operator is not None:
+            row['operator'] = operator
+            row['lower' if operator in (">", ">=") else 'upper'] = parse_quantity(value, lab)
+        elif relation not in ("", None):
+            # Lab value lower and upper limits
+            lower, upper = parse_limits(relation, value, lab)
+            row.update(operator="range", lower=lower, upper=upper)
+
+    # Function to add a list of {"NCTId", column_name} records, e.g. the output of extract_lab_values
+    def add_records(self, records, column_name="LAB_VALUES", kind="extracted", trial_texts=None):
+        for record in records:
+            trial_text = trial_texts.get(record["NCTId"]) if trial_texts else None
+            self.add(record["NCTId"], record.get(column_name, ""), kind=kind, trial_text=trial_text)
+        return self
+
+    # Materialized typed frame. The rows added since the last access are concatenated once and the
+    # result is kept until the next add, so repeated reads between adds cost nothing.
+    @property
+    def frame(self):
+        if self.dirty:
+            # Categoricals with different categories concatenate to object; typed() restores the dtypes
+            new_rows = pd.DataFrame(self.rows, columns=STORE_COLUMNS)
+            self.frame_cache = self.typed(pd.concat([self.frame_cache, new_rows], ignore_index=True) if len(self.frame_cache) else new_rows)
+            self.rows = []
+            self.dirty = False
+        return self.frame_cache
+
+    # Wide table for display: one row per trial, one column per lab
+    def display_table(self, kind="extracted", with_units=False, nct_ids=None):
+        frame = self.frame[self.frame['kind'] == kind]
+        if frame.empty:
+            return pd.DataFrame({"NCTId": list(nct_ids or [])})
+        if kind == "database_ready":
+            cells = "[" + frame['lower'].map(repr) + ", " + frame['upper'].map(repr) + "]"
+        else:
+            cells = (frame['relation'] + " " + frame['value_text']).str.strip()
+        labs = frame['lab'].astype(str)
+        if with_units:
+            labs = labs + " (" + labs.map(STANDARD_UNITS) + ")"
+        table = pd.DataFrame({'NCTId': frame['NCTId'], 'lab': labs, 'cell': cells})
+        table = table.pivot_table(index='NCTId', columns='lab', values='cell', aggfunc='last', sort=False)
+        table.columns.name = None
+        if nct_ids is not None:
+            table = table.reindex(list(nct_ids))
+        return table.reset_index()
+
+    # Function to find the trials whose requirement for a lab admits the given value (in the standard unit)
+    def trials_accepting(self, lab, value, kind="database_ready"):
+        frame = self.frame
+        rows = frame[(frame['kind'] == kind) & (frame['lab'] == lab)]
+        lower = rows['lower'].to_numpy()
+        upper = rows['upper'].to_numpy()
+        ok = (np.isnan(lower) | (lower <= value)) & (np.isnan(upper) | (value <= upper))
+        return rows['NCTId'].to_numpy()[ok].tolist()
+
+    # Function to write the store to path, replacing it atomically so readers never see a partial file
+    def save(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temporary = f"{path}.tmp-{os.getpid()}-{id(self)}"
+        try:
+            self.frame.to_parquet(temporary, index=False)
+            os.replace(temporary, path)
+        finally:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+
+    # Function to write this store into an on-disk store, replacing every row of the trials added here
+    # for the same kind (a trial whose new response has no requirements loses its old rows).
+    # The read-modify-write runs under a file lock, so sessions finishing together do not lose rows.
+    def merge_into(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with file_lock(path):
+            if os.path.exists(path):
+                existing = self.load(path).frame
+                keys = self.processed | set(zip(self.frame['NCTId'], self.frame['kind'].astype(str)))
+                keep = [key not in keys for key in zip(existing['NCTId'], existing['kind'].astype(str))]
+                merged = LabRequirementStore(self.typed(pd.concat([existing[keep], self.frame], ignore_index=True)))
+            else:
+                merged = self
+            merged.save(path)
+        return merged
+
+    @classmethod
+    def load(cls, path):
+        return cls(cls.typed(pd.read_parquet(path)))
@@ -1,8 +1,18 @@
+import os
+import time
+import numpy as np
 import streamlit as st
 import pandas as pd
-import re
-from module1 import extract_lab_values
+from module1 import iter_extract_lab_values
 from module2 import prepare_database_ready_answers
+from fused_extraction import iter_extract_and_normalize
+from lab_store import LabRequirementStore
+from memory_report import estimate_bytes, format_bytes, session_memory
+from metrics import metrics
+from prefetch import ExtractionPrefetcher
+from trial_index import TrialIndex
+from trial_search import TrialSearchIndex
+from trial_data import DATA_FILE, data_version, load_trials
 
 # Streamlit setup for clinical trial data filtering and processing
 st.set_page_config(page_title="SmartLab AI Clinical Data Processor", layout="wide")
@@ -13,111 +23,173 @@ st.image("1.png", use_column_width=True)
 # Title directly below the image
 st.title("SmartLab AI Clinical Data Processor")
 
-# Load the clinical trials data file directly
-@st.cache_data
-def load_data():
-    return pd.read_pickle("clinical_trials_data_filtered.pkl")
-
-# Function to parse JSON-like output into structured DataFrame with modified column names for units
-def parse_output(output_data, column_name="LAB_VALUES", is_database_ready=False):
-    parsed_data = []
-    for entry in output_data:
-        nct_id = entry.get("NCTId")
-        values_str = entry.get(column_name, "")
-        parsed_entry = {"NCTId": nct_id}
-
-        # Define base units for specific lab values
-        base_units = {
-            "Absolute neutrophil count (ANC) or absolute granulocyte count required": "x10^9/L",
-            "Hemoglobin required": "g/L",
-            "Platelet count required": "x10^9/L",
-            "Creatinine clearance or GFR required": "ml/min",
-            "Bilirubin required": "xULN"
-        }
-
-        # Regular expression to match "Lab Name required": ["relationship", "value"]
-        matches = re.findall(r'"([^"]+ required)": \["([^"]*)", "([^"]*)"\]', values_str)
-        for match in matches:
-            lab_name = match[0]
-            relationship = match[1]
-            value = match[2]
-
-            # If processing database-ready answers, modify column name to include unit
-            if is_database_ready and lab_name in base_units:
-                lab_name = f"{lab_name} ({base_units[lab_name]})"
-            parsed_entry[lab_name] = f"{relationship} {value}".strip()
-        
-        # Alternative pattern to capture range values
-        alt_matches = re.findall(r'"([^"]+ required)": \[([0-9.]+), ([0-9.]+)\]', values_str)
-        for alt_match in alt_matches:
-            lab_name = alt_match[0]
-            lower_limit = alt_match[1]
-            upper_limit = alt_match[2]
-
-            # If processing database-ready answers, modify column name to include unit
-            if is_database_ready and lab_name in base_units:
-                lab_name = f"{lab_name} ({base_units[lab_name]})"
-            parsed_entry[lab_name] = f"[{lower_limit}, {upper_limit}]"
-        
-        parsed_data.append(parsed_entry)
-    
-    return pd.DataFrame(parsed_data)
+# Load and prepare the clinical trials data once per data file version and share the same frame
+# with every session (no per-session copy). Sessions keep row positions into it and must not
+# modify it. concatenated_text is only built for the trials being extracted.
+@st.cache_resource
+def load_data(version):
+    return load_trials(DATA_FILE, concatenate=False)
+
+# Size of the shared frame, measured once per data file version
+@st.cache_resource
+def shared_data_bytes(_df, version):
+    return estimate_bytes(_df)
+
+# Build the sidebar filter index once per dataset version and share it across reruns and sessions
+@st.cache_resource
+def load_trial_index(_df, version):
+    return TrialIndex(_df, ['NCTId', 'Conditions', 'BriefTitle', 'EligibilityCriteria'])
+
+# Open the ranked-search index for this dataset version, building it under .cache/ the first time.
+# Its arrays are memory-mapped, so every session and worker process shares one copy.
+@st.cache_resource
+def load_search_index(_df, version):
+    return TrialSearchIndex.load_or_build(_df, os.path.join(".cache", "search_index", version))
+
+LAB_STORE_PATH = os.path.join("results", "lab_requirements.parquet")
+# Minimum time between refreshes of the live results table while trials stream in
+LIVE_TABLE_REFRESH_SECONDS = 1.0
+
+# Function to parse model output records into a typed lab requirement store (each response is decoded once).
+# Returns the LabRequirementStore; use its display_table() or frame for a DataFrame.
+def build_lab_store(output_data, column_name="LAB_VALUES", is_database_ready=False, trial_texts=None):
+    kind = "database_ready" if is_database_ready else "extracted"
+    return LabRequirementStore().add_records(output_data, column_name=column_name, kind=kind, trial_texts=trial_texts)
 
 # Load the data automatically
 try:
-    df_all = load_data()
+    load_started = time.perf_counter()
+    df_all = load_data(data_version())
+    load_seconds = time.perf_counter() - load_started
 except FileNotFoundError:
     st.error("Data file not found. Please ensure 'clinical_trials_data_filtered.pkl' is in the project directory.")
 
-# Initialize session state for filtered data and outputs if not already done
-if 'df_filtered' not in st.session_state:
-    st.session_state.df_filtered = pd.DataFrame()
+# Initialize session state for filtered data and outputs if not already done.
+# The filter result is kept as row positions into the shared frame, tagged with its data version.
+if 'filtered_rows' not in st.session_state:
+    st.session_state.filtered_rows = np.empty(0, dtype=np.int64)
+    st.session_state.filtered_version = None
 if 'lab_values_output' not in st.session_state:
     st.session_state.lab_values_output = None
 if 'db_ready_output' not in st.session_state:
     st.session_state.db_ready_output = None
+if 'prefetcher' not in st.session_state:
+    st.session_state.prefetcher = ExtractionPrefetcher()
 
 # Process the data if loaded successfully
 if 'df_all' in locals():
-    # Function to flatten list columns if necessary
-    def flatten_list_columns(df):
-        for column in df.columns:
-            if df[column].apply(lambda x: isinstance(x, list)).any():
-                df[column] = df[column].apply(lambda x: ', '.join(map(str, x)) if isinstance(x, list) else x)
-        return df
-
-    df_all = flatten_list_columns(df_all)
-    df_all.columns = ['NCTId', 'Conditions', 'Keywords', 'BriefTitle', 'EligibilityCriteria']
-    df_all['concatenated_text'] = df_all.apply(lambda row: "\n".join([str(cell) for cell in row]), axis=1)
-    
+    version = data_version()
+    if st.session_state.filtered_version != version:
+        st.session_state.filtered_rows = np.empty(0, dtype=np.int64)
+    df_filtered = df_all.iloc[st.session_state.filtered_rows]
+
     # Sidebar filter inputs
     st.sidebar.header("Filter Trials by Following Keywords/ Fields")
-    nct_id = st.sidebar.text_input("Enter NCTId")
-    conditions = st.sidebar.text_input("Enter Condition Keywords")
-    brief_title = st.sidebar.text_input("Enter Brief Title Keywords")
-    eligibility_criteria = st.sidebar.text_input("Enter Eligibility Criteria Keywords")
+    search_mode = st.sidebar.radio("Search mode", ["Keyword filter", "Ranked search"], horizontal=True)
+    if search_mode == "Ranked search":
+        search_query = st.sidebar.text_input("Search Trials (free text)")
+        top_k = st.sidebar.number_input("Number of trials", min_value=1, max_value=1000, value=50)
+    else:
+        nct_id = st.sidebar.text_input("Enter NCTId")
+        conditions = st.sidebar.text_input("Enter Condition Keywords")
+        brief_title = st.sidebar.text_input("Enter Brief Title Keywords")
+        eligibility_criteria = st.sidebar.text_input("Enter Eligibility Criteria Keywords")
+    prefetch = st.sidebar.checkbox(
+        "Prefetch lab values for filtered trials",
+        help=f"Start extracting up to {st.session_state.prefetcher.max_trials} filtered trial(s) in the background, so Extract Lab Values is served from the cache",
+    )
     
-    if st.sidebar.button("Filter Clinical Trials"):
-        # Apply filters and store results in session state
-        mask = (
-            df_all['NCTId'].str.contains(nct_id, case=False) & 
-            df_all['Conditions'].str.contains(conditions, case=False) &
-            df_all['BriefTitle'].str.contains(brief_title, case=False) &
-            df_all['EligibilityCriteria'].str.contains(eligibility_criteria, case=False)
-        )
-        st.session_state.df_filtered = df_all[mask]
+    if st.sidebar.button("Search Clinical Trials" if search_mode == "Ranked search" else "Filter Clinical Trials"):
+        # Apply filters (or the ranked search, best match first) and store the row positions in session state
+        filter_started = time.perf_counter()
+        if search_mode == "Ranked search":
+            st.session_state.filtered_rows, scores = load_search_index(df_all, version).search(search_query, int(top_k))
+        else:
+            mask = load_trial_index(df_all, version).filter({
+                'NCTId': nct_id,
+                'Conditions': conditions,
+                'BriefTitle': brief_title,
+                'EligibilityCriteria': eligibility_criteria,
+            })
+            st.session_state.filtered_rows, scores = np.flatnonzero(mask), None
+        st.session_state.filtered_version = version
+        df_filtered = df_all.iloc[st.session_state.filtered_rows]
+        st.session_state.filter_seconds = time.perf_counter() - filter_started
+        # A new filter cancels the previous prefetch; with prefetch on, the new filtered set is started
+        st.session_state.prefetcher.cancel()
+        if prefetch:
+            st.session_state.prefetcher.start(df_filtered, fused=st.session_state.get('fused_mode', False))
         st.write("Filtered Clinical Trials:")
-        st.dataframe(st.session_state.df_filtered)
+        st.dataframe(df_filtered if scores is None else df_filtered.assign(Score=scores))
     
+    # Timing readout for the cached data preparation and the last filter
+    st.sidebar.caption(
+        f"Data ready in {load_seconds * 1000:.1f} ms; "
+        f"last filter took {st.session_state.get('filter_seconds', 0) * 1000:.1f} ms"
+    )
+    prefetch_status = st.session_state.prefetcher.status()
+    if prefetch_status['total']:
+        state = "running" if prefetch_status['running'] else "stopped"
+        st.sidebar.caption(f"Prefetched {prefetch_status['done']} of {prefetch_status['total']} trial(s) ({state})")
+
     # Display processing options if filtered data is available
-    if not st.session_state.df_filtered.empty:
+    if not df_filtered.empty:
         st.subheader("Process Selected IDs")
-        selected_ids = st.multiselect("Select NCTId(s) to Process", st.session_state.df_filtered['NCTId'].tolist())
+        selected_ids = st.multiselect("Select NCTId(s) to Process", df_filtered['NCTId'].tolist())
+        fused = st.checkbox("Extract and normalize in one model call per trial", value=False, key="fused_mode")
         
         if st.button("Extract Lab Values"):
-            selected_data = st.session_state.df_filtered[st.session_state.df_filtered['NCTId'].isin(selected_ids)]
-            st.session_state.lab_values_output = extract_lab_values(selected_data)
+            selected_data = df_filtered[df_filtered['NCTId'].isin(selected_ids)]
+            # Trials the prefetch finished are cache hits; stop it so it does not compete with this run
+            st.session_state.prefetcher.cancel()
+            extraction_stats = {}
+
+            # Stream results into session state as each trial completes, so a cancelled or failed batch is kept.
+            # Pressing Cancel reruns the script, which stops this loop and drops the calls not yet started.
+            st.session_state.lab_values_output = []
+            st.session_state.db_ready_output = [] if fused else None
+            st.session_state.lab_store = LabRequirementStore()
+            st.session_state.extraction_complete = False
+            trial_texts = dict(zip(selected_data['NCTId'], selected_data['EligibilityCriteria']))
+            progress = st.progress(0.0, text=f"Extracting lab values for {len(selected_data)} trial(s)...")
+            st.button("Cancel Extraction")
+            live_table = st.empty()
+            extraction_started = time.perf_counter()
+            last_refresh = 0.0
+            try:
+                records = (iter_extract_and_normalize if fused else iter_extract_lab_values)(selected_data, stats=extraction_stats)
+                for record in records:
+                    if fused:
+                        st.session_state.db_ready_output.append({"NCTId": record['NCTId'], "DatabaseReadyLabValues": record.pop('DatabaseReadyLabValues')})
+                    st.session_state.lab_values_output.append(record)
+                    with metrics.stage("parse"):
+                        st.session_state.lab_store.add(record['NCTId'], record['LAB_VALUES'], trial_text=trial_texts.get(record['NCTId']))
+                    done = len(st.session_state.lab_values_output)
+                    progress.progress(done / len(selected_data), text=f"Extracted {done} of {len(selected_data)} trial(s)")
+                    # Re-render the whole table at most once per interval, not once per trial
+                    if time.perf_counter() - last_refresh >= LIVE_TABLE_REFRESH_SECONDS:
+                        with metrics.stage("render"):
+                            live_table.table(st.session_state.lab_store.display_table(
+                                nct_ids=[record['NCTId'] for record in st.session_state.lab_values_output]))
+                        last_refresh = time.perf_counter()
+            except Exception as e:
+                st.error(f"Extraction stopped after {len(st.session_state.lab_values_output)} trial(s): {e}")
+                st.stop()
+            metrics.observe("stage", "extract", time.perf_counter() - extraction_started)
+            live_table.empty()
+
+            # Put the results back in the order the trials were selected
+            order = {nct: position for position, nct in enumerate(selected_data['NCTId'])}
+            st.session_state.lab_values_output.sort(key=lambda record: order[record['NCTId']])
+            if fused:
+                st.session_state.db_ready_output.sort(key=lambda record: order[record['NCTId']])
+            st.session_state.extraction_complete = True
+            st.session_state.lab_store.merge_into(LAB_STORE_PATH)
             st.success("Lab Values Extraction Complete")
+            st.caption(
+                f"Model calls avoided by the lab-term prefilter: {extraction_stats['calls_avoided']} of {extraction_stats['trials']}; "
+                f"prompt tokens saved by criteria slicing: {extraction_stats['tokens_saved']}"
+            )
             
             # Display original JSON output
             st.write("Extracted Lab Values (JSON):")
@@ -125,13 +197,20 @@ if 'df_all' in locals():
             
             # Parse and display extracted lab values in table format
             if st.session_state.lab_values_output:
-                lab_values_df = parse_output(st.session_state.lab_values_output, column_name="LAB_VALUES")
+                lab_values_df = st.session_state.lab_store.display_table(nct_ids=selected_data['NCTId'])
                 st.write("Extracted Lab Values in Table Format:")
                 st.table(lab_values_df)
         
+        elif st.session_state.lab_values_output and not st.session_state.get('extraction_complete', True):
+            # Keep showing what a cancelled or failed extraction produced before it stopped
+            st.warning(f"Extraction was interrupted; keeping {len(st.session_state.lab_values_output)} partial result(s).")
+            st.table(st.session_state.lab_store.display_table(nct_ids=[record['NCTId'] for record in st.session_state.lab_values_output]))
+
         if st.session_state.lab_values_output is not None:
             if st.button("Prepare Database Ready Answers"):
-                st.session_state.db_ready_output = prepare_database_ready_answers(st.session_state.lab_values_output)
+                # Fused extraction already produced the ranges; only the two-call flow needs the normalize pass
+                if not (st.session_state.get('extraction_complete') and st.session_state.db_ready_output):
+                    st.session_state.db_ready_output = prepare_database_ready_answers(st.session_state.lab_values_output)
                 st.success("Database Ready Answers Prepared")
                 
                 # Display original JSON output
@@ -140,6 +219,34 @@ if 'df_all' in locals():
                 
                 # Parse and display database-ready answers in table format with unit in column name
                 if st.session_state.db_ready_output:
-                    db_ready_df = parse_output(st.session_state.db_ready_output, column_name="DatabaseReadyLabValues", is_database_ready=True)
-                    st.write("Final Database Ready Answers in Table Format:")
-                    st.table(db_ready_df)
+                    with metrics.stage("parse"):
+                        db_ready_store = build_lab_store(st.session_state.db_ready_output, column_name="DatabaseReadyLabValues", is_database_ready=True)
+                    db_ready_store.merge_into(LAB_STORE_PATH)
+                    with metrics.stage("render"):
+                        # One row per trial, including trials without any range
+                        db_ready_df = db_ready_store.display_table(kind="database_ready", with_units=True,
+                                                                   nct_ids=[record['NCTId'] for record in st.session_state.db_ready_output])
+                        st.write("Final Database Ready Answers in Table Format:")
+                        st.table(db_ready_df)
+
+    # Collapsible panel with model-call and pipeline-stage metrics for this server process
+    with st.expander("LLM Usage Metrics"):
+        summary = metrics.summary()
+        if summary:
+            st.dataframe(pd.DataFrame(summary))
+        else:
+            st.write("No model calls or pipeline stages recorded yet.")
+        st.download_button("Download Prometheus metrics", data=metrics.to_prometheus(), file_name="smartlab_metrics.prom", mime="text/plain")
+        st.download_button("Download metric events (JSONL)", data=metrics.to_jsonl(), file_name="smartlab_metrics.jsonl", mime="application/json")
+        if st.button("Export metrics to results/"):
+            os.makedirs("results", exist_ok=True)
+            metrics.export_prometheus(os.path.join("results", "smartlab_metrics.prom"))
+            metrics.export_jsonl(os.path.join("results", "smartlab_metrics.jsonl"))
+            st.success("Metrics exported to results/smartlab_metrics.prom and results/smartlab_metrics.jsonl")
+
+    # Memory held by this session versus the frame shared by all sessions, for server sizing
+    with st.expander("Memory Usage"):
+        rows = session_memory(st.session_state)
+        st.write(f"Shared trial data (once per process): {format_bytes(shared_data_bytes(df_all, version))}")
+        st.write(f"This session: {format_bytes(sum(row['bytes'] for row in rows))}")
+        st.dataframe(pd.DataFrame(rows))
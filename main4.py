@@ -1,6 +1,9 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from clb_ingest import read_clb_phases
+from upload_cache import file_digest, get_stage_cache
+from severity_engine import NO_VARIANCE_LABEL, classify_severity, severity_rules
 
 # Function to calculate max value in Baseline based on the Activity condition
 def calculate_max(df):
@@ -24,26 +27,21 @@ def calculate_max(df):
     final_df = merged_df[merged_df['Baseline'] == merged_df['Max Baseline (child)']]
     return final_df
 
-# Function to read and display fields from the new excel file and perform pivoting
-def read_and_pivot_excel(file):
-    required_columns = [
-        'Project ID', 'Feasibility Start', 'Feasibility Finish', 
-        'Design Start', 'Design Finish', 'Execution Start', 
-        'Execution Finish', 'Closure Start', 'Closure Finish'
-    ]
-    df_new = pd.read_excel(file, sheet_name="Current AMP BL NominalFY25$", skiprows=3)
-    if all(col in df_new.columns for col in required_columns):
-        df_filtered = df_new[required_columns]
-        df_pivot = pd.DataFrame()
-        phases = ['Feasibility', 'Design', 'Execution', 'Closure']
-        for phase in phases:
-            temp_df = df_filtered[['Project ID', f'{phase} Start', f'{phase} Finish']].copy()
-            temp_df.columns = ['Project ID', 'CLB Start Date', 'CLB Finish Date']
-            temp_df['Activity'] = phase
-            df_pivot = pd.concat([df_pivot, temp_df], ignore_index=True)
-        return df_pivot
-    else:
-        return "The required columns are not present in the Excel sheet."
+# Function to read the first uploaded file (CSV or Excel)
+def read_first_file(uploaded_file):
+    if uploaded_file.name.endswith('.csv'):
+        return pd.read_csv(uploaded_file)
+    elif uploaded_file.name.endswith('.xlsx'):
+        return pd.read_excel(uploaded_file)
+
+# Function to return a stage's cached output, computing it only when the uploads or parameters in key change
+def cached(stage, key, compute):
+    return get_stage_cache().get_or_compute(stage, key, compute)
+
+# Function to read the required fields from the new excel file and pivot them to one row per phase
+# (only the 9 required columns are read; stats receives rows per second)
+def read_and_pivot_excel(file, stats=None):
+    return read_clb_phases(file, stats=stats)
 
 # Function to compare dates between first and second file based on Project ID and Activity
 def compare_dates(first_df, second_df):
@@ -79,18 +77,9 @@ def compare_dates(first_df, second_df):
     final_df = final_df.reset_index(drop=True)
     return final_df
 
-# Function to categorize severity
-def categorize_severity(row):
-    if row['Start Date Variance (days)'] > 365 or row['Finish Date Variance (days)'] > 365:
-        return 'High Severity'
-    elif (90 <= row['Start Date Variance (days)'] <= 365) or (90 <= row['Finish Date Variance (days)'] <= 365):
-        return 'Medium Severity'
-    elif (0 <= row['Start Date Variance (days)'] < 90) or (0 <= row['Finish Date Variance (days)'] < 90):
-        return 'Low Severity'
-    elif row['Start Date Variance (days)'] < 0 or row['Finish Date Variance (days)'] < 0:
-        return 'Negative Variance'
-    else:
-        return 'No Variance'
+# Function to categorize severity for all rows at once (categorical Severity column)
+def categorize_severity(df, rules=None):
+    return classify_severity(df, rules)
 
 # Function to create a pie chart for variance summary
 def plot_variance_summary(df):
@@ -115,6 +104,7 @@ def plot_variance_summary(df):
 # Function to create a pie chart for severity summary
 def plot_summary_pie(df):
     severity_counts = df['Severity'].value_counts()
+    severity_counts = severity_counts[severity_counts > 0]
     summary_df = pd.DataFrame({'Severity': severity_counts.index, 'Count': severity_counts.values})
     
     fig = px.pie(summary_df, values='Count', names='Severity', title='Severity-Wise Summary')
@@ -148,13 +138,15 @@ def main():
     
     uploaded_file = st.file_uploader("Upload your first file for max baseline calculation", type=['csv', 'xlsx'])
     first_df = None
+    first_key, second_digest = (), None
     
     if uploaded_file is not None:
         try:
-            if uploaded_file.name.endswith('.csv'):
-                df = pd.read_csv(uploaded_file)
-            elif uploaded_file.name.endswith('.xlsx'):
-                df = pd.read_excel(uploaded_file)
+            # Every stage below is keyed by the hash of the uploaded bytes, so reruns reuse it
+            first_digest = file_digest(uploaded_file)
+            # The file name picks the reader (CSV or Excel), so it is part of every key built on this upload
+            first_key = (first_digest, uploaded_file.name)
+            df = cached("read_first", first_key, lambda: read_first_file(uploaded_file))
             
             st.write("Data preview:")
             st.dataframe(df, height=300)
@@ -164,12 +156,12 @@ def main():
                 'Activity', 'Activity (child)', 'Baseline Start Date', 'Baseline Finish Date'
             ]
             if all(column in df.columns for column in required_columns):
-                first_df = calculate_max(df)
+                first_df = cached("calculate_max", first_key + tuple(required_columns), lambda: calculate_max(df))
                 
                 st.markdown("<h3 style='color: #009688;'>Filtered Data (Baseline = Max Baseline)</h3>", unsafe_allow_html=True)
                 st.dataframe(first_df, height=300)
                 
-                csv = first_df.to_csv(index=False).encode('utf-8')
+                csv = cached("first_csv", first_key, lambda: first_df.to_csv(index=False).encode('utf-8'))
                 st.download_button(
                     label="Download data as CSV",
                     data=csv,
@@ -188,13 +180,18 @@ def main():
     
     if new_uploaded_file is not None:
         try:
-            second_df = read_and_pivot_excel(new_uploaded_file)
+            second_digest = file_digest(new_uploaded_file)
+            ingest_stats = {}
+            second_df, ingest_stats = cached("read_and_pivot", (second_digest,),
+                                             lambda: (read_and_pivot_excel(new_uploaded_file, stats=ingest_stats), ingest_stats))
             
             if isinstance(second_df, pd.DataFrame):
+                st.caption(f"Read {ingest_stats['sheet_rows']} rows in {ingest_stats['total_seconds']:.2f} s "
+                           f"({ingest_stats['rows_per_second']:.0f} rows/s, {ingest_stats['engine']})")
                 st.markdown("<h3 style='color: #009688;'>Pivoted Data with Activity, CLB Start Date, and CLB Finish Date</h3>", unsafe_allow_html=True)
                 st.dataframe(second_df, height=300)
                 
-                csv = second_df.to_csv(index=False).encode('utf-8')
+                csv = cached("second_csv", (second_digest,), lambda: second_df.to_csv(index=False).encode('utf-8'))
                 st.download_button(
                     label="Download pivoted data as CSV",
                     data=csv,
@@ -210,29 +207,39 @@ def main():
     if first_df is not None and second_df is not None:
         st.markdown("<h2 style='color: #4CAF50;'>📅 LN VS CLB Comparison</h2>", unsafe_allow_html=True)
         
+        # Severity thresholds (days); changing them only rebuilds the rule table
+        threshold_columns = st.columns(2)
+        medium_days = threshold_columns[0].number_input("Medium severity from (days)", min_value=0, value=90, step=1)
+        high_days = threshold_columns[1].number_input("High severity above (days)", min_value=0, value=365, step=1)
+        if medium_days > high_days:
+            st.warning("The medium threshold is above the high threshold, so no row will be rated Medium Severity.")
+        rules = severity_rules(medium_days, high_days)
+
         compare = st.button("🔍 Run Comparison")
         
         if compare:
             try:
-                comparison_df = compare_dates(first_df, second_df)
+                comparison_key = (*first_key, second_digest)
+                comparison_df = cached("compare_dates", comparison_key, lambda: compare_dates(first_df, second_df))
                 
                 st.markdown("<h3 style='color: #009688;'>Comparison of Dates (with variance)</h3>", unsafe_allow_html=True)
                 st.dataframe(comparison_df, height=300)
                 
                 # Plot Summary Pie Chart for Variance (Total, Positive, Negative)
                 st.markdown("<h3 style='color: #FF5733;'>Summary of Variance</h3>", unsafe_allow_html=True)
-                fig_variance = plot_variance_summary(comparison_df)
+                fig_variance = cached("variance_chart", comparison_key, lambda: plot_variance_summary(comparison_df))
                 st.plotly_chart(fig_variance)
 
                 # Categorize severity based on variance
-                comparison_df['Severity'] = comparison_df.apply(categorize_severity, axis=1)
+                severity_key = comparison_key + (medium_days, high_days)
+                comparison_df['Severity'] = cached("severity", severity_key, lambda: categorize_severity(comparison_df, rules))
 
                 # Display categorized data
                 st.markdown("<h3 style='color: #FF5733;'>Categorized Data Based on Severity</h3>", unsafe_allow_html=True)
                 st.dataframe(comparison_df, height=300)
 
                 # Download button for the categorized dataframe
-                csv_categorized = comparison_df.to_csv(index=False).encode('utf-8')
+                csv_categorized = cached("categorized_csv", severity_key, lambda: comparison_df.to_csv(index=False).encode('utf-8'))
                 st.download_button(
                     label="Download categorized data as CSV",
                     data=csv_categorized,
@@ -241,20 +248,18 @@ def main():
                 )
 
                 # Severity explanation
-                st.markdown("""
+                definitions = "".join(f"<li><b>{rule.label}:</b> {rule.describe()} (start or finish)</li>" for rule in rules)
+                st.markdown(f"""
                     <h3 style='color: #FF5733;'>Severity Definitions</h3>
                     <ul>
-                        <li><b>High Severity:</b> Variance greater than 365 days</li>
-                        <li><b>Medium Severity:</b> Variance between 90 and 365 days</li>
-                        <li><b>Low Severity:</b> Variance less than 90 days</li>
-                        <li><b>Negative Variance:</b> Negative variance indicating early completion</li>
-                        <li><b>No Variance:</b> No variance between planned and actual dates</li>
+                        {definitions}
+                        <li><b>{NO_VARIANCE_LABEL}:</b> No variance between planned and actual dates</li>
                     </ul>
                 """, unsafe_allow_html=True)
 
                 # Plot Summary Pie Chart for the Severity
                 st.markdown("<h3 style='color: #FF5733;'>Severity Summary</h3>", unsafe_allow_html=True)
-                fig_severity = plot_summary_pie(comparison_df)
+                fig_severity = cached("severity_chart", severity_key, lambda: plot_summary_pie(comparison_df))
                 st.plotly_chart(fig_severity)
                 
             except Exception as e:
@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+from clb_ingest import read_clb_phases
+from upload_cache import file_digest, get_stage_cache
 
 # Function to calculate max value in Baseline based on the Activity condition
 def calculate_max(df):
@@ -24,26 +26,21 @@ def calculate_max(df):
     final_df = merged_df[merged_df['Baseline'] == merged_df['Max Baseline (child)']]
     return final_df
 
-# Function to read and display fields from the new excel file and perform pivoting
-def read_and_pivot_excel(file):
-    required_columns = [
-        'Project ID', 'Feasibility Start', 'Feasibility Finish', 
-        'Design Start', 'Design Finish', 'Execution Start', 
-        'Execution Finish', 'Closure Start', 'Closure Finish'
-    ]
-    df_new = pd.read_excel(file, sheet_name="Current AMP BL NominalFY25$", skiprows=3)
-    if all(col in df_new.columns for col in required_columns):
-        df_filtered = df_new[required_columns]
-        df_pivot = pd.DataFrame()
-        phases = ['Feasibility', 'Design', 'Execution', 'Closure']
-        for phase in phases:
-            temp_df = df_filtered[['Project ID', f'{phase} Start', f'{phase} Finish']].copy()
-            temp_df.columns = ['Project ID', 'CLB Start Date', 'CLB Finish Date']
-            temp_df['Activity'] = phase
-            df_pivot = pd.concat([df_pivot, temp_df], ignore_index=True)
-        return df_pivot
-    else:
-        return "The required columns are not present in the Excel sheet."
+# Function to read the first uploaded file (CSV or Excel)
+def read_first_file(uploaded_file):
+    if uploaded_file.name.endswith('.csv'):
+        return pd.read_csv(uploaded_file)
+    elif uploaded_file.name.endswith('.xlsx'):
+        return pd.read_excel(uploaded_file)
+
+# Function to return a stage's cached output, computing it only when the uploads or parameters in key change
+def cached(stage, key, compute):
+    return get_stage_cache().get_or_compute(stage, key, compute)
+
+# Function to read the required fields from the new excel file and pivot them to one row per phase
+# (only the 9 required columns are read; stats receives rows per second)
+def read_and_pivot_excel(file, stats=None):
+    return read_clb_phases(file, stats=stats)
 
 # Function to compare dates between first and second file based on Project ID and Activity
 def compare_dates(first_df, second_df):
@@ -209,13 +206,15 @@ def main():
     
     uploaded_file = st.file_uploader("Upload your first file for max baseline calculation", type=['csv', 'xlsx'])
     first_df = None
+    first_key, second_digest = (), None
     
     if uploaded_file is not None:
         try:
-            if uploaded_file.name.endswith('.csv'):
-                df = pd.read_csv(uploaded_file)
-            elif uploaded_file.name.endswith('.xlsx'):
-                df = pd.read_excel(uploaded_file)
+            # Every stage below is keyed by the hash of the uploaded bytes, so reruns reuse it
+            first_digest = file_digest(uploaded_file)
+            # The file name picks the reader (CSV or Excel), so it is part of every key built on this upload
+            first_key = (first_digest, uploaded_file.name)
+            df = cached("read_first", first_key, lambda: read_first_file(uploaded_file))
             
             st.write("Data preview:")
             st.dataframe(df, height=300)
@@ -225,12 +224,12 @@ def main():
                 'Activity', 'Activity (child)', 'Baseline Start Date', 'Baseline Finish Date'
             ]
             if all(column in df.columns for column in required_columns):
-                first_df = calculate_max(df)
+                first_df = cached("calculate_max", first_key + tuple(required_columns), lambda: calculate_max(df))
                 
                 st.markdown("<h3 style='color: #009688;'>Filtered Data (Baseline = Max Baseline)</h3>", unsafe_allow_html=True)
                 st.dataframe(first_df, height=300)
                 
-                csv = first_df.to_csv(index=False).encode('utf-8')
+                csv = cached("first_csv", first_key, lambda: first_df.to_csv(index=False).encode('utf-8'))
                 st.download_button(
                     label="Download data as CSV",
                     data=csv,
@@ -249,13 +248,18 @@ def main():
     
     if new_uploaded_file is not None:
         try:
-            second_df = read_and_pivot_excel(new_uploaded_file)
+            second_digest = file_digest(new_uploaded_file)
+            ingest_stats = {}
+            second_df, ingest_stats = cached("read_and_pivot", (second_digest,),
+                                             lambda: (read_and_pivot_excel(new_uploaded_file, stats=ingest_stats), ingest_stats))
             
             if isinstance(second_df, pd.DataFrame):
+                st.caption(f"Read {ingest_stats['sheet_rows']} rows in {ingest_stats['total_seconds']:.2f} s "
+                           f"({ingest_stats['rows_per_second']:.0f} rows/s, {ingest_stats['engine']})")
                 st.markdown("<h3 style='color: #009688;'>Pivoted Data with Activity, CLB Start Date, and CLB Finish Date</h3>", unsafe_allow_html=True)
                 st.dataframe(second_df, height=300)
                 
-                csv = second_df.to_csv(index=False).encode('utf-8')
+                csv = cached("second_csv", (second_digest,), lambda: second_df.to_csv(index=False).encode('utf-8'))
                 st.download_button(
                     label="Download pivoted data as CSV",
                     data=csv,
@@ -275,18 +279,22 @@ def main():
         
         if compare or st.session_state.comparison_run:
             try:
-                comparison_df = compare_dates(first_df, second_df)
+                comparison_key = (*first_key, second_digest)
+                comparison_df = cached("compare_dates", comparison_key, lambda: compare_dates(first_df, second_df))
                 
                 st.markdown("<h3 style='color: #009688;'>Comparison of Dates (with variance)</h3>", unsafe_allow_html=True)
                 st.dataframe(comparison_df, height=300)
 
                 # Generate the combined visual for counts and percentages
-                fig_combined = plot_combined_chart_with_counts(comparison_df)
+                fig_combined = cached("combined_chart", comparison_key, lambda: plot_combined_chart_with_counts(comparison_df))
                 st.markdown("<h3 style='color: #FF5733;'>Combined Visual with Counts and Percentages</h3>", unsafe_allow_html=True)
                 st.plotly_chart(fig_combined)
 
                 # Generate downloadable files for each case
-                ln_blank_clb_not_df, clb_blank_ln_not_df, ln_start_blank_clb_not_df, ln_finish_blank_clb_not_df, clb_start_blank_ln_not_df, clb_finish_blank_ln_not_df = generate_case_files(comparison_df)
+                # The six case files are encoded once per comparison, so a download click does not redo them
+                ln_blank_clb_not_csv, clb_blank_ln_not_csv, ln_start_blank_clb_not_csv, ln_finish_blank_clb_not_csv, clb_start_blank_ln_not_csv, clb_finish_blank_ln_not_csv = cached(
+                    "case_csvs", comparison_key,
+                    lambda: tuple(case_df.to_csv(index=False).encode('utf-8') for case_df in generate_case_files(comparison_df)))
 
                 # Display beautiful download buttons for each case
                 st.markdown("<h3 style='color: #FF5733;'>Download Filtered Data for Each Case</h3>", unsafe_allow_html=True)
@@ -294,37 +302,37 @@ def main():
 
                 st.download_button(
                     label="Download LN Start & Finish Blank, CLB Not Blank",
-                    data=ln_blank_clb_not_df.to_csv(index=False).encode('utf-8'),
+                    data=ln_blank_clb_not_csv,
                     file_name='ln_blank_clb_not_blank.csv',
                     mime='text/csv',
                 )
                 st.download_button(
                     label="Download CLB Start & Finish Blank, LN Not Blank",
-                    data=clb_blank_ln_not_df.to_csv(index=False).encode('utf-8'),
+                    data=clb_blank_ln_not_csv,
                     file_name='clb_blank_ln_not_blank.csv',
                     mime='text/csv',
                 )
                 st.download_button(
                     label="Download LN Start Blank, CLB Start Not Blank",
-                    data=ln_start_blank_clb_not_df.to_csv(index=False).encode('utf-8'),
+                    data=ln_start_blank_clb_not_csv,
                     file_name='ln_start_blank_clb_start_not_blank.csv',
                     mime='text/csv',
                 )
                 st.download_button(
                     label="Download LN Finish Blank, CLB Finish Not Blank",
-                    data=ln_finish_blank_clb_not_df.to_csv(index=False).encode('utf-8'),
+                    data=ln_finish_blank_clb_not_csv,
                     file_name='ln_finish_blank_clb_finish_not_blank.csv',
                     mime='text/csv',
                 )
                 st.download_button(
                     label="Download CLB Start Blank, LN Start Not Blank",
-                    data=clb_start_blank_ln_not_df.to_csv(index=False).encode('utf-8'),
+                    data=clb_start_blank_ln_not_csv,
                     file_name='clb_start_blank_ln_start_not_blank.csv',
                     mime='text/csv',
                 )
                 st.download_button(
                     label="Download CLB Finish Blank, LN Finish Not Blank",
-                    data=clb_finish_blank_ln_not_df.to_csv(index=False).encode('utf-8'),
+                    data=clb_finish_blank_ln_not_csv,
                     file_name='clb_finish_blank_ln_finish_not_blank.csv',
                     mime='text/csv',
                 )
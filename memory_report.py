@@ -0,0 +1,41 @@
+import sys
+import numpy as np
+import pandas as pd
+
+# Function to estimate the bytes held by an object, following containers and object attributes
+# once each; pandas objects are measured with deep memory usage, numpy arrays by their buffer
+def estimate_bytes(obj, seen=None):
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    if isinstance(obj, np.ndarray):
+        size = obj.nbytes if obj.base is None else 0  # a view shares its base's buffer
+        if obj.dtype == object:
+            size += sum(estimate_bytes(item, seen) for item in obj.flat)
+        return sys.getsizeof(obj) + size
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_bytes(key, seen) + estimate_bytes(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(estimate_bytes(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__") and not isinstance(obj, type):
+        size += estimate_bytes(vars(obj), seen)
+    return size
+
+# Function to report the bytes held by each session_state entry, largest first. An object reachable
+# from several entries (e.g. the shared trial frame) is counted once, under the first of them.
+def session_memory(state, exclude=()):
+    seen = set()
+    rows = [{"key": key, "bytes": estimate_bytes(value, seen)} for key, value in state.items() if key not in exclude]
+    return sorted(rows, key=lambda row: row["bytes"], reverse=True)
+
+def format_bytes(size):
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
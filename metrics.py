@@ -0,0 +1,133 @@
+import json
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+
+# Latency buckets (seconds) for the Prometheus histogram export
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# HELP text of each exported metric family (names without the prefix and _total/_seconds suffix)
+METRIC_HELP = {
+    "model_calls": "Model calls that returned a response.",
+    "model_errors": "Model calls that raised an error.",
+    "retries": "Model calls retried after a transient error.",
+    "cache_hits": "Model responses served from the response cache.",
+    "cache_misses": "Model responses not found in the response cache.",
+    "schema_failures": "Fused responses that failed the schema check.",
+    "prompt_chars": "Characters sent to the model.",
+    "response_chars": "Characters received from the model.",
+    "request_chars": "Characters sent per request, by prompt mode.",
+    "model_call": "Model call latency.",
+    "stage": "Pipeline stage duration.",
+    "time_to_first_token": "Time until the first streamed response chunk, by prompt mode.",
+}
+
+# Process-wide, thread-safe store of per-call and per-stage measurements. Aggregates are kept
+# per stage (extract, normalize, slice, render, ...) and the most recent events are kept for JSONL export.
+class MetricsRegistry:
+    def __init__(self, max_events=10000):
+        self.lock = threading.Lock()
+        self.events = deque(maxlen=max_events)
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.counters = defaultdict(int)
+            self.latency_sum = defaultdict(float)
+            self.latency_count = defaultdict(int)
+            self.latency_buckets = defaultdict(lambda: [0] * len(LATENCY_BUCKETS))
+            self.events.clear()
+
+    def increment(self, name, stage="", amount=1):
+        with self.lock:
+            self.counters[(name, stage)] += amount
+
+    def observe(self, name, stage, seconds, **fields):
+        with self.lock:
+            key = (name, stage)
+            self.latency_sum[key] += seconds
+            self.latency_count[key] += 1
+            buckets = self.latency_buckets[key]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    buckets[i] += 1
+            self.events.append({"ts": time.time(), "metric": name, "stage": stage, "seconds": seconds, **fields})
+
+    # Function to time one model call and record its latency, prompt/response sizes and errors
+    def observe_model_call(self, stage, prompt, call):
+        started = time.perf_counter()
+        try:
+            response = call()
+        except Exception as e:
+            self.increment("model_errors", stage)
+            self.observe("model_call", stage, time.perf_counter() - started,
+                         prompt_chars=len(prompt), error=type(e).__name__)
+            raise
+        self.increment("model_calls", stage)
+        self.increment("prompt_chars", stage, len(prompt))
+        self.increment("response_chars", stage, len(response or ""))
+        self.observe("model_call", stage, time.perf_counter() - started,
+                     prompt_chars=len(prompt), response_chars=len(response or ""))
+        return response
+
+    # Context manager to time a pipeline stage, e.g. `with metrics.stage("parse"):`
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("stage", name, time.perf_counter() - started)
+
+    # One row per (metric, stage) with counts, totals and mean latency, for the metrics panel
+    def summary(self):
+        with self.lock:
+            rows = defaultdict(dict)
+            for (name, stage), value in self.counters.items():
+                rows[stage][name] = value
+            for (name, stage), count in self.latency_count.items():
+                rows[stage][f"{name}_count"] = count
+                rows[stage][f"{name}_mean_seconds"] = self.latency_sum[(name, stage)] / count
+        return [{"stage": stage, **values} for stage, values in sorted(rows.items())]
+
+    # Prometheus text exposition: every family gets its # HELP and # TYPE lines before its samples
+    def to_prometheus(self, prefix="smartlab"):
+        lines = []
+        described = set()
+
+        def describe(metric, name, kind):
+            if metric not in described:
+                described.add(metric)
+                lines.append(f"# HELP {metric} {METRIC_HELP.get(name, name.replace('_', ' ').capitalize() + '.')}")
+                lines.append(f"# TYPE {metric} {kind}")
+
+        with self.lock:
+            for (name, stage), value in sorted(self.counters.items()):
+                describe(f"{prefix}_{name}_total", name, "counter")
+                lines.append(f'{prefix}_{name}_total{{stage="{stage}"}} {value}')
+            for key in sorted(self.latency_count):
+                name, stage = key
+                metric = f"{prefix}_{name}_seconds"
+                describe(metric, name, "histogram")
+                for bound, count in zip(LATENCY_BUCKETS, self.latency_buckets[key]):
+                    lines.append(f'{metric}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+                lines.append(f'{metric}_bucket{{stage="{stage}",le="+Inf"}} {self.latency_count[key]}')
+                lines.append(f'{metric}_sum{{stage="{stage}"}} {self.latency_sum[key]}')
+                lines.append(f'{metric}_count{{stage="{stage}"}} {self.latency_count[key]}')
+        return "\n".join(lines) + "\n"
+
+    def export_prometheus(self, path):
+        with open(path, "w") as f:
+            f.write(self.to_prometheus())
+
+    def to_jsonl(self):
+        with self.lock:
+            return "".join(json.dumps(event) + "\n" for event in self.events)
+
+    # Function to write the events held in memory; the file is replaced, so repeated exports do not duplicate events
+    def export_jsonl(self, path):
+        with open(path, "w") as f:
+            f.write(self.to_jsonl())
+
+metrics = MetricsRegistry()
@@ -0,0 +1,141 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from lab_prefilter import EMPTY_LAB_VALUES
+from metrics import metrics
+from response_cache import cached_call
+
+DEFAULT_MODEL_NAME = "gemini-1.5-flash"
+DEFAULT_TIMEOUT = 120.0
+
+# Send the static instruction block as a system instruction registered once per model
+# (set SMARTLAB_SYSTEM_INSTRUCTION=0 to go back to one inline prompt per request)
+USE_SYSTEM_INSTRUCTION = os.environ.get("SMARTLAB_SYSTEM_INSTRUCTION", "1") != "0"
+
+# Backend that calls Gemini through one configured GenerativeModel per system instruction, so
+# every thread in the process reuses the same clients and their underlying connection pool.
+class GeminiBackend:
+    def __init__(self, model_name=DEFAULT_MODEL_NAME, api_key=None):
+        api_key = api_key or os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("GEMINI_API_KEY is not set. Export your Gemini API key, or set SMARTLAB_MODEL_BACKEND=stub to run offline.")
+        import google.generativeai as genai
+        genai.configure(api_key=api_key)
+        self.genai = genai
+        self.model_name = model_name
+        self.models = {None: genai.GenerativeModel(model_name)}
+        self.lock = threading.Lock()
+
+    # Model with the given system instruction registered, built once and reused for every request
+    def model_for(self, system_instruction):
+        with self.lock:
+            if system_instruction not in self.models:
+                self.models[system_instruction] = self.genai.GenerativeModel(self.model_name, system_instruction=system_instruction)
+            return self.models[system_instruction]
+
+    def generate(self, prompt, timeout=None, system_instruction=None):
+        model = self.model_for(system_instruction)
+        started = time.perf_counter()
+        chunks = []
+        # Stream the response so time-to-first-token can be measured per prompt mode
+        for chunk in model.generate_content(prompt, request_options={"timeout": timeout or DEFAULT_TIMEOUT}, stream=True):
+            if not chunks:
+                metrics.observe("time_to_first_token", prompt_mode(system_instruction), time.perf_counter() - started)
+            chunks.append(chunk.text)
+        return "".join(chunks)
+
+# Deterministic offline backend for load tests and benchmarks. It sleeps for a configurable
+# latency (plus optional jitter seeded from the prompt) and streams responder(prompt) back in
+# chunks; time-to-first-token is measured when the first chunk arrives, as for Gemini.
+class StubBackend:
+    def __init__(self, latency=0.0, jitter=0.0, responder=None, model_name="stub"):
+        self.latency = latency
+        self.jitter = jitter
+        self.responder = responder or default_stub_response
+        self.model_name = model_name
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def generate(self, prompt, timeout=None, system_instruction=None):
+        if system_instruction:
+            prompt = f"{system_instruction}\n{prompt}"
+        with self.lock:
+            self.calls += 1
+        delay = self.latency
+        if self.jitter:
+            seed = int(hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8], 16)
+            delay += random.Random(seed).uniform(0, self.jitter)
+        started = time.perf_counter()
+        chunks = []
+        for chunk in self.stream(prompt, delay, timeout):
+            if not chunks:
+                metrics.observe("time_to_first_token", prompt_mode(system_instruction), time.perf_counter() - started)
+            chunks.append(chunk)
+        return "".join(chunks)
+
+    def stream(self, prompt, delay, timeout=None, chunk_chars=256):
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError(f"Stub call exceeded timeout of {timeout} s")
+        if delay:
+            time.sleep(delay)
+        response = self.responder(prompt)
+        for start in range(0, max(len(response), 1), chunk_chars):
+            yield response[start:start + chunk_chars]
+
+def prompt_mode(system_instruction):
+    return "system_instruction" if system_instruction else "inline"
+
+# Empty extraction result, keyed by NCTId when several trials were packed into one prompt
+def default_stub_response(prompt):
+    nct_ids = re.findall(r"### NCTId: (\S+)", prompt)
+    if nct_ids:
+        return json.dumps({nct_id: json.loads(EMPTY_LAB_VALUES) for nct_id in nct_ids})
+    return EMPTY_LAB_VALUES
+
+# Function to build the backend named by SMARTLAB_MODEL_BACKEND ("gemini" or "stub")
+def backend_from_environment():
+    name = os.environ.get("SMARTLAB_MODEL_BACKEND", "gemini").lower()
+    if name == "stub":
+        return StubBackend(latency=float(os.environ.get("SMARTLAB_STUB_LATENCY", "0")),
+                           jitter=float(os.environ.get("SMARTLAB_STUB_JITTER", "0")))
+    return GeminiBackend(os.environ.get("SMARTLAB_MODEL_NAME", DEFAULT_MODEL_NAME))
+
+_backend = None
+_backend_lock = threading.Lock()
+
+# Function to get the process-wide model backend, created on first use
+def get_client():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = backend_from_environment()
+        return _backend
+
+# Function to swap the process-wide backend, e.g. set_client(StubBackend(latency=0.5))
+def set_client(backend):
+    global _backend
+    with _backend_lock:
+        _backend = backend
+    return backend
+
+# Function to ask the model about one text. The instruction block and safety preamble go into the
+# system instruction, so each request only carries the trial-specific text.
+def ask_model(prompt, text, preamble, stage, use_cache=True, timeout=None, is_valid=None):
+    client = get_client()
+    if USE_SYSTEM_INSTRUCTION:
+        system_instruction = f"Question: {prompt}\n{preamble}"
+        content = f"Text: {text}\nAnswer:"
+    else:
+        system_instruction = None
+        content = f"Question: {prompt}\nText: {text}\n{preamble}\nAnswer:"
+    metrics.increment("request_chars", prompt_mode(system_instruction), len(content))
+    return cached_call(
+        client.model_name, system_instruction or "", content,
+        lambda: metrics.observe_model_call(stage, content, lambda: client.generate(content, timeout=timeout, system_instruction=system_instruction)),
+        use_cache=use_cache, stage=stage, is_valid=is_valid,
+    )
@@ -0,0 +1,68 @@
+import os
+import threading
+from fused_extraction import iter_extract_and_normalize
+from metrics import metrics
+from module1 import iter_extract_lab_values
+
+# Cap on the trials one filter may extract speculatively, and the worker count used for it
+PREFETCH_MAX_TRIALS = int(os.environ.get("SMARTLAB_PREFETCH_MAX_TRIALS", "20"))
+PREFETCH_WORKERS = int(os.environ.get("SMARTLAB_PREFETCH_WORKERS", "2"))
+
+# Speculative extraction of a filtered set on a background thread. Results land in the shared
+# response cache, so a later "Extract Lab Values" for the same trials is served from it.
+# Starting a new prefetch (e.g. after the filter changes) cancels the previous one.
+class ExtractionPrefetcher:
+    def __init__(self, max_trials=PREFETCH_MAX_TRIALS, max_workers=PREFETCH_WORKERS):
+        self.max_trials = max_trials
+        self.max_workers = max_workers
+        self.lock = threading.Lock()
+        self.cancel_event = threading.Event()
+        self.thread = None
+        self.done = 0
+        self.total = 0
+        self.error = None
+
+    # Function to start prefetching the first max_trials rows of df
+    def start(self, df, fused=False):
+        self.cancel()
+        trials = df.head(self.max_trials)
+        cancel_event = threading.Event()
+        with self.lock:
+            self.cancel_event = cancel_event
+            self.done, self.total, self.error = 0, len(trials), None
+        if trials.empty:
+            return
+        self.thread = threading.Thread(target=self.run, args=(trials, fused, cancel_event), daemon=True, name="extraction-prefetch")
+        self.thread.start()
+
+    def run(self, trials, fused, cancel_event):
+        extract = iter_extract_and_normalize if fused else iter_extract_lab_values
+        records = extract(trials, max_workers=self.max_workers, use_cache=True)
+        try:
+            for _ in records:
+                if cancel_event.is_set():
+                    break
+                metrics.increment("prefetched_trials", "prefetch")
+                with self.lock:
+                    self.done += 1
+        except Exception as e:
+            with self.lock:
+                self.error = e
+        finally:
+            # Closing the generator drops the calls that have not started yet
+            records.close()
+
+    # Function to stop the running prefetch; calls already in flight finish and are still cached
+    def cancel(self):
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                metrics.increment("prefetch_cancelled", "prefetch")
+            self.cancel_event.set()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive() and not self.cancel_event.is_set()
+
+    def status(self):
+        with self.lock:
+            return {"done": self.done, "total": self.total, "running": self.running, "error": self.error}
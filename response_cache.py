@@ -0,0 +1,137 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from metrics import metrics
+
+# Default location of the shared on-disk cache; override with SMARTLAB_CACHE_PATH
+DEFAULT_CACHE_PATH = os.environ.get("SMARTLAB_CACHE_PATH", os.path.join(".cache", "gemini_responses.sqlite3"))
+
+# SQLite-backed cache of model responses keyed by a hash of model name, prompt and input text.
+# WAL mode lets several Streamlit worker processes read and write the same file concurrently.
+class ResponseCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=50000, max_age_seconds=30 * 24 * 3600, evict_every=100):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_seconds = max_age_seconds
+        self.evict_every = evict_every
+        self.writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.local = threading.local()
+        self.stats_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self.connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, model TEXT, response TEXT, created_at REAL, accessed_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        conn.commit()
+
+    # One connection per thread, since extraction runs on a thread pool
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            self.local.conn = conn
+        return conn
+
+    @staticmethod
+    def make_key(model_name, prompt, text):
+        digest = hashlib.sha256()
+        for part in (model_name, prompt, text):
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    def get(self, key):
+        conn = self.connection()
+        row = conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        now = time.time()
+        if row is not None and self.max_age_seconds and now - row[1] > self.max_age_seconds:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            conn.commit()
+            row = None
+        with self.stats_lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        if row is None:
+            return None
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        conn.commit()
+        return row[0]
+
+    def set(self, key, model_name, response):
+        now = time.time()
+        conn = self.connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, model, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, model_name, response, now, now),
+        )
+        conn.commit()
+        with self.stats_lock:
+            self.writes += 1
+            due = self.writes % self.evict_every == 0
+        if due:
+            self.evict()
+
+    # Drop entries past max_age_seconds, then the least recently used ones beyond max_entries
+    def evict(self):
+        conn = self.connection()
+        if self.max_age_seconds:
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age_seconds,))
+        if self.max_entries:
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+        conn.commit()
+
+    def clear(self):
+        conn = self.connection()
+        conn.execute("DELETE FROM responses")
+        conn.commit()
+
+    def stats(self):
+        entries = self.connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+        }
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+# Function to get the process-wide cache, created lazily on first use
+def get_cache():
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
+
+# Function to return a cached response or call generate() and store its result.
+# When is_valid is given, only responses it accepts are stored, so a retry re-asks the model.
+def cached_call(model_name, prompt, text, generate, use_cache=True, stage="", is_valid=None):
+    if not use_cache:
+        return generate()
+    cache = get_cache()
+    key = cache.make_key(model_name, prompt, text)
+    response = cache.get(key)
+    metrics.increment("cache_hits" if response is not None else "cache_misses", stage)
+    if response is None:
+        response = generate()
+        if is_valid is None or is_valid(response):
+            cache.set(key, model_name, response)
+    return response
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+VARIANCE_COLUMNS = ['Start Date Variance (days)', 'Finish Date Variance (days)']
+NO_VARIANCE_LABEL = 'No Variance'
+
+# One severity band: a row matches when any variance column lies between lower and upper
+# (None for an open bound; the include flags make a bound inclusive)
+class SeverityRule:
+    def __init__(self, label, lower=None, upper=None, include_lower=True, include_upper=True):
+        self.label = label
+        self.lower = lower
+        self.upper = upper
+        self.include_lower = include_lower
+        self.include_upper = include_upper
+
+    def matches(self, values):
+        mask = np.ones(values.shape, dtype=bool)
+        with np.errstate(invalid="ignore"):
+            if self.lower is not None:
+                mask &= values >= self.lower if self.include_lower else values > self.lower
+            if self.upper is not None:
+                mask &= values <= self.upper if self.include_upper else values < self.upper
+        return mask.any(axis=1)
+
+    # Band as text for the severity definitions, e.g. "90 ≤ variance ≤ 365 days"
+    def describe(self):
+        if self.upper is None and self.lower is not None:
+            return f"variance {'≥' if self.include_lower else '>'} {self.lower} days"
+        lower = "" if self.lower is None else f"{self.lower} {'≤' if self.include_lower else '<'} "
+        upper = "" if self.upper is None else f" {'≤' if self.include_upper else '<'} {self.upper}"
+        return f"{lower}variance{upper} days"
+
+# Function to build the rule table, highest precedence first. The defaults are the original
+# categorize_severity cutoffs: High > 365, Medium 90..365, Low 0..89, Negative < 0.
+def severity_rules(medium_days=90, high_days=365):
+    return [
+        SeverityRule('High Severity', lower=high_days, include_lower=False),
+        SeverityRule('Medium Severity', lower=medium_days, upper=high_days),
+        SeverityRule('Low Severity', lower=0, upper=medium_days, include_upper=False),
+        SeverityRule('Negative Variance', upper=0, include_upper=False),
+    ]
+
+# Function to label every row in one pass: each rule becomes a boolean mask over the variance
+# columns and np.select picks the first matching rule, so rule order is the precedence.
+# Rows no rule matches (no variance values) get default.
+def classify_severity(df, rules=None, columns=VARIANCE_COLUMNS, default=NO_VARIANCE_LABEL):
+    rules = severity_rules() if rules is None else rules
+    values = df[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+    labels = [rule.label for rule in rules]
+    codes = np.select([rule.matches(values) for rule in rules], np.arange(len(rules)), default=len(rules))
+    categories = list(dict.fromkeys(labels + [default]))
+    codes = np.asarray([categories.index(label) for label in labels + [default]])[codes]
+    return pd.Series(pd.Categorical.from_codes(codes, categories=categories), index=df.index, name='Severity')
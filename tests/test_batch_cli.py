@@ -0,0 +1,134 @@
+import json
+import re
+import pandas as pd
+import pytest
+import batch_cli
+import model_client
+
+def write_trials(path, count, hemoglobin=None):
+    hemoglobin = hemoglobin or list(range(count))
+    pd.DataFrame({
+        "NCTId": [f"NCT{i:08d}" for i in range(count)],
+        "BriefTitle": [f"Trial {i}" for i in range(count)],
+        "EligibilityCriteria": [f"Inclusion Criteria:\n- Hemoglobin > {value} g/dL" for value in hemoglobin],
+        "Keywords": [["k"]] * count,
+        "Conditions": [["c"]] * count,
+    }).to_pickle(path)
+
+def output_ids(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line)["NCTId"] for line in f if line.strip()]
+
+@pytest.fixture
+def stub(monkeypatch):
+    backend = model_client.StubBackend()
+    monkeypatch.setattr(model_client, "_backend", backend)
+    return backend
+
+def run(data, output, *extra):
+    batch_cli.main(["--data", str(data), "--output", str(output), "--no-cache", "--max-workers", "1", *extra])
+
+def test_rerun_reuses_finished_trials(tmp_path, stub):
+    data, output = tmp_path / "trials.pkl", tmp_path / "out.jsonl"
+    write_trials(data, 3)
+    run(data, output)
+    calls = stub.calls
+    run(data, output)
+    assert stub.calls == calls
+    assert sorted(output_ids(output)) == [f"NCT{i:08d}" for i in range(3)]
+
+def test_records_without_a_manifest_line_are_not_duplicated(tmp_path, stub):
+    data, output = tmp_path / "trials.pkl", tmp_path / "out.jsonl"
+    write_trials(data, 3)
+    run(data, output)
+    # Simulate a crash after a record was written but before the manifest recorded it
+    write_trials(data, 4)
+    with open(output, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"NCTId": "NCT00000003", "LAB_VALUES": "{}", "DatabaseReadyLabValues": "{}"}) + "\n")
+    run(data, output)
+    assert sorted(output_ids(output)) == [f"NCT{i:08d}" for i in range(4)]
+
+def test_limit_only_processes_the_slice(tmp_path, stub):
+    data, output = tmp_path / "trials.pkl", tmp_path / "out.jsonl"
+    write_trials(data, 5)
+    run(data, output, "--limit", "2")
+    assert output_ids(output) == ["NCT00000000", "NCT00000001"]
+
+def test_legacy_checkpoint_entries_are_extracted_again(tmp_path, stub):
+    data, output = tmp_path / "trials.pkl", tmp_path / "out.jsonl"
+    write_trials(data, 2)
+    # Output and .done checkpoint left by a run that predates the manifest
+    with open(output, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"NCTId": "NCT00000000", "LAB_VALUES": "old", "DatabaseReadyLabValues": "old"}) + "\n")
+    (tmp_path / "out.jsonl.done").write_text("NCT00000000\n")
+    run(data, output)
+    assert sorted(output_ids(output)) == ["NCT00000000", "NCT00000001"]
+    with open(output, encoding="utf-8") as f:
+        assert all(json.loads(line)["LAB_VALUES"] != "old" for line in f)
+    calls = stub.calls
+    run(data, output)
+    assert stub.calls == calls
+
+def test_fingerprint_covers_the_normalizer(monkeypatch):
+    import lab_normalizer
+    import module2
+    from extraction_manifest import pipeline_fingerprint
+    fingerprint = pipeline_fingerprint()
+    assert pipeline_fingerprint(fused=True) != fingerprint
+    monkeypatch.setattr(module2, "NORMALIZE_PROMPT", module2.NORMALIZE_PROMPT + " ")
+    assert pipeline_fingerprint() != fingerprint
+    monkeypatch.undo()
+    monkeypatch.setitem(lab_normalizer.LAB_STANDARDS["Hemoglobin required"], "step", 0.5)
+    assert pipeline_fingerprint() != fingerprint
+
+# Stub reply that reads the hemoglobin threshold back from the trial text
+def echo_hemoglobin(prompt):
+    values = re.findall(r"Hemoglobin > (\d+) g/dL", prompt)
+    return json.dumps({"Hemoglobin required": ["greater than", f"{values[-1]} g/dL"] if values else ["", ""]})
+
+def test_parquet_refresh_keeps_the_new_record(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_client, "_backend", model_client.StubBackend(responder=echo_hemoglobin))
+    data, output = tmp_path / "trials.pkl", tmp_path / "out"
+    write_trials(data, 3)
+    run(data, output, "--format", "parquet", "--chunk-size", "1")
+    # The refreshed trial is written as part 0 of the second run, after parts 0-2 of the first
+    write_trials(data, 3, hemoglobin=[0, 1, 50])
+    run(data, output, "--format", "parquet", "--chunk-size", "1")
+    frame = pd.concat([pd.read_parquet(path) for path in output.glob("*.parquet")])
+    assert sorted(frame["NCTId"]) == ["NCT00000000", "NCT00000001", "NCT00000002"]
+    assert "50 g/dL" in frame.set_index("NCTId").loc["NCT00000002", "LAB_VALUES"]
+
+def test_normalize_fallback_is_rate_limited_and_retried(tmp_path, monkeypatch, capsys):
+    import concurrency
+    from module2 import NORMALIZE_PROMPT
+
+    class CountingLimiter:
+        acquired = 0
+
+        def acquire(self):
+            self.acquired += 1
+    limiters = []
+    monkeypatch.setattr(concurrency, "make_rate_limiter", lambda rpm: limiters.append(CountingLimiter()) or limiters[-1])
+    monkeypatch.setattr(concurrency.time, "sleep", lambda seconds: None)
+    failures = []
+
+    class ServiceUnavailable(Exception):
+        code = 503
+
+    # Extraction returns a value without a unit, so normalization asks the model, which fails once with a 503
+    def responder(prompt):
+        if NORMALIZE_PROMPT in prompt:
+            if not failures:
+                failures.append(1)
+                raise ServiceUnavailable("Service Unavailable")
+            return json.dumps({"Hemoglobin required": [90.0, 250.0]})
+        return json.dumps({"Hemoglobin required": ["greater than", "9"]})
+    monkeypatch.setattr(model_client, "_backend", model_client.StubBackend(responder=responder))
+    data, output = tmp_path / "trials.pkl", tmp_path / "out.jsonl"
+    write_trials(data, 1)
+    run(data, output, "--requests-per-minute", "60", "--limit", "1")
+    with open(output, encoding="utf-8") as f:
+        assert json.loads(json.loads(f.readline())["DatabaseReadyLabValues"]) == {"Hemoglobin required": [90.0, 250.0]}
+    # One limiter for the normalize stage: two acquisitions, the failed call and its retry
+    assert limiters[0].acquired == 2
+    assert "no longer in the data" not in capsys.readouterr().out
@@ -0,0 +1,39 @@
+import json
+import pandas as pd
+import model_client
+import response_cache
+from criteria_slicer import estimate_tokens
+from lab_prefilter import EMPTY_LAB_VALUES
+from module1 import extract_lab_values_batched, pack_batches, packed_trial
+
+def test_batches_leave_room_for_the_prompt():
+    records = [(f"NCT{i:08d}", "x" * 400) for i in range(10)]
+    prompt = "p" * 800
+    batches = pack_batches(records, 1000, prompt)
+    assert sum(len(batch) for batch in batches) == len(records)
+    for batch in batches:
+        assert estimate_tokens(prompt) + sum(estimate_tokens(packed_trial(*record)) for record in batch) <= 1000
+
+def test_oversized_trial_gets_its_own_batch():
+    batches = pack_batches([("NCT1", "x" * 4000), ("NCT2", "y")], 100)
+    assert [len(batch) for batch in batches] == [1, 1]
+
+def test_partial_batch_response_is_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "_default_cache", response_cache.ResponseCache(str(tmp_path / "cache.sqlite3")))
+
+    # The first trial of every packed batch is missing from the response
+    def responder(prompt):
+        nct_ids = [line.split(": ")[1] for line in prompt.splitlines() if line.startswith("### NCTId: ")]
+        if nct_ids:
+            return json.dumps({nct_id: json.loads(EMPTY_LAB_VALUES) for nct_id in nct_ids[1:]})
+        return EMPTY_LAB_VALUES
+    stub = model_client.StubBackend(responder=responder)
+    monkeypatch.setattr(model_client, "_backend", stub)
+    df = pd.DataFrame({"NCTId": ["NCT1", "NCT2"], "concatenated_text": ["hemoglobin > 9", "platelets > 100"]})
+
+    records = extract_lab_values_batched(df, 100000, max_workers=1)
+    assert [record["LAB_VALUES"] for record in records] == [EMPTY_LAB_VALUES] * 2
+    calls = stub.calls
+    # The packed request is sent again on a rerun; the single-trial retry is served from the cache
+    extract_lab_values_batched(df, 100000, max_workers=1)
+    assert stub.calls == calls + 1
@@ -0,0 +1,20 @@
+import json
+import model_client
+from benchmark import synthetic_response, synthetic_trials
+from fused_extraction import FUSED_PROMPT, validate_fused_response
+from module1 import extract_lab_values
+
+def test_packed_prompts_get_one_answer_per_trial(monkeypatch):
+    backend = model_client.StubBackend(responder=synthetic_response)
+    monkeypatch.setattr(model_client, "_backend", backend)
+    trials = synthetic_trials(20, lab_density=0.5)
+    batched = extract_lab_values(trials, max_workers=1, use_cache=False, batch_token_budget=2000)
+    assert backend.calls < len(trials)
+    single = extract_lab_values(trials, max_workers=1, use_cache=False)
+    assert [record["LAB_VALUES"] for record in batched] == [record["LAB_VALUES"] for record in single]
+
+def test_fused_prompts_get_the_fused_schema():
+    text = synthetic_trials(1, lab_density=1.0)["concatenated_text"].iloc[0]
+    lab_values, model_ranges = validate_fused_response(synthetic_response(f"{FUSED_PROMPT}\nText: {text}"))
+    assert model_ranges and set(model_ranges) <= set(lab_values)
+    assert isinstance(json.loads(synthetic_response(f"Question\nText: {text}"))["Hemoglobin required"], list)
@@ -0,0 +1,72 @@
+import datetime
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+from clb_ingest import CLB_SHEET, MISSING_COLUMNS_MESSAGE, PHASES, read_clb_phases
+
+ENGINES = ["calamine", None]
+
+# The per-phase read and concat read_clb_phases replaced
+def old_read_and_pivot_excel(file):
+    required_columns = [
+        'Project ID', 'Feasibility Start', 'Feasibility Finish',
+        'Design Start', 'Design Finish', 'Execution Start',
+        'Execution Finish', 'Closure Start', 'Closure Finish'
+    ]
+    df_new = pd.read_excel(file, sheet_name="Current AMP BL NominalFY25$", skiprows=3)
+    if all(col in df_new.columns for col in required_columns):
+        df_filtered = df_new[required_columns]
+        df_pivot = pd.DataFrame()
+        phases = ['Feasibility', 'Design', 'Execution', 'Closure']
+        for phase in phases:
+            temp_df = df_filtered[['Project ID', f'{phase} Start', f'{phase} Finish']].copy()
+            temp_df.columns = ['Project ID', 'CLB Start Date', 'CLB Finish Date']
+            temp_df['Activity'] = phase
+            df_pivot = pd.concat([df_pivot, temp_df], ignore_index=True)
+        return df_pivot
+    else:
+        return "The required columns are not present in the Excel sheet."
+
+def write_clb_workbook(path, rows=6, header=None):
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = CLB_SHEET
+    for line in ["CLB baseline", "exported", ""]:
+        sheet.append([line])
+    header = header or (['Notes', 'Project ID'] + [f'{phase} {edge}' for phase in PHASES for edge in ('Start', 'Finish')] + ['Owner'])
+    sheet.append(header)
+    start = datetime.datetime(2024, 1, 1)
+    for row in range(rows):
+        dates = [None if (row + column) % 5 == 0 else start + datetime.timedelta(days=row * 10 + column, hours=row)
+                 for column in range(8)]
+        sheet.append([f"note {row}", f"P{row:03d}"] + dates + [f"owner {row}"])
+    workbook.save(path)
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_matches_the_per_phase_concat(tmp_path, engine):
+    path = tmp_path / "clb.xlsx"
+    write_clb_workbook(path)
+    new = read_clb_phases(path, engine=engine)
+    old = old_read_and_pivot_excel(path)
+    assert new.columns.tolist() == old.columns.tolist()
+    assert new['Project ID'].tolist() == old['Project ID'].tolist()
+    assert new['Activity'].astype(str).tolist() == old['Activity'].tolist()
+    for column in ('CLB Start Date', 'CLB Finish Date'):
+        assert new[column].tolist() == old[column].astype("datetime64[s]").tolist()
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_output_dtypes(tmp_path, engine):
+    path = tmp_path / "clb.xlsx"
+    write_clb_workbook(path)
+    stats = {}
+    new = read_clb_phases(path, engine=engine, stats=stats)
+    assert new['CLB Start Date'].dtype == "datetime64[s]" and new['CLB Finish Date'].dtype == "datetime64[s]"
+    assert isinstance(new['Activity'].dtype, pd.CategoricalDtype)
+    assert list(new['Activity'].cat.categories) == PHASES
+    assert stats['sheet_rows'] == 6 and stats['rows'] == 24
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_missing_column_returns_the_message(tmp_path, engine):
+    path = tmp_path / "clb.xlsx"
+    write_clb_workbook(path, header=['Project ID', 'Feasibility Start'])
+    assert read_clb_phases(path, engine=engine) == MISSING_COLUMNS_MESSAGE
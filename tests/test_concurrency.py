@@ -0,0 +1,76 @@
+import time
+import pytest
+import concurrency
+from concurrency import TokenBucket, call_with_retry, is_transient_error, run_concurrently
+
+class HttpError(Exception):
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+class Response:
+    status_code = 503
+
+class ResponseError(Exception):
+    response = Response()
+
+@pytest.mark.parametrize("error, transient", [
+    (TimeoutError("timed out"), True),
+    (ConnectionResetError("reset by peer"), True),
+    (HttpError(429), True),
+    (HttpError(503), True),
+    (ResponseError("bad gateway"), True),
+    (HttpError(400), False),
+    (ValueError("could not parse 1500 rows"), False),
+    (RuntimeError("connection string 503 is invalid"), False),
+])
+def test_transient_errors_are_classified_by_type_and_status(error, transient):
+    assert is_transient_error(error) is transient
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    delays = []
+    monkeypatch.setattr(concurrency.time, "sleep", delays.append)
+    monkeypatch.setattr(concurrency.random, "uniform", lambda low, high: high)
+    return delays
+
+def test_transient_errors_are_retried_with_capped_backoff(sleeps):
+    attempts = []
+
+    def flaky(item):
+        attempts.append(item)
+        if len(attempts) < 4:
+            raise HttpError(429)
+        return item * 2
+    assert call_with_retry(flaky, 21, max_retries=5, base_delay=1.0, max_delay=3.0) == 42
+    assert sleeps == [1.0, 2.0, 3.0]
+
+def test_retries_stop_after_max_retries(sleeps):
+    def always_timing_out(item):
+        raise TimeoutError("timed out")
+    with pytest.raises(TimeoutError):
+        call_with_retry(always_timing_out, None, max_retries=2)
+    assert len(sleeps) == 2
+
+def test_other_errors_are_not_retried(sleeps):
+    calls = []
+
+    def broken(item):
+        calls.append(item)
+        raise ValueError("could not parse 1500 rows")
+    with pytest.raises(ValueError):
+        call_with_retry(broken, None, max_retries=3)
+    assert len(calls) == 1 and sleeps == []
+
+def test_results_keep_the_input_order():
+    # Later items finish first
+    results = run_concurrently(lambda item: time.sleep((10 - item) * 0.002) or item * item, range(10), max_workers=4)
+    assert results == [item * item for item in range(10)]
+
+def test_token_bucket_paces_calls():
+    bucket = TokenBucket(rate_per_second=50, capacity=1)
+    started = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # The first call uses the initial token; the other five wait 1/50 s each
+    assert time.monotonic() - started >= 0.09
@@ -0,0 +1,39 @@
+import pandas as pd
+from criteria_slicer import SECTION_HEADER_PATTERN, SECTION_START_PATTERN, is_section_header, slice_criteria, slice_criteria_text
+
+def test_bare_headers_are_headers():
+    for line in ("Inclusion Criteria:", "Key Exclusion Criteria", "EXCLUSION:", "- Inclusion criteria for part A"):
+        assert is_section_header(line)
+
+def test_header_with_lab_or_number_is_not_a_bare_header():
+    for line in ("Inclusion: ANC ≥ 1500/µL", "Exclusion criteria: creatinine > 1.5 mg/dL", "Inclusion criteria: age >= 18"):
+        assert not is_section_header(line)
+
+def test_header_with_lab_content_is_kept():
+    assert slice_criteria_text("Inclusion: ANC ≥ 1500/µL") == "Inclusion: ANC ≥ 1500/µL"
+
+def test_header_with_lab_content_followed_by_header_is_kept():
+    text = "Exclusion criteria: creatinine > 1.5 mg/dL\nInclusion Criteria:\n- Age over 18"
+    assert slice_criteria_text(text) == "Exclusion criteria: creatinine > 1.5 mg/dL"
+
+def test_lab_lines_keep_their_section_header():
+    text = "Inclusion Criteria:\n- Age > 18\n- Hemoglobin > 9 g/dL. Able to swallow.\nExclusion Criteria:\n- Bilirubin > 1.5 x ULN"
+    assert slice_criteria_text(text) == "Inclusion Criteria:\n- Hemoglobin > 9 g/dL.\nExclusion Criteria:\n- Bilirubin > 1.5 x ULN"
+
+def test_sections_without_labs_are_dropped():
+    text = "Inclusion Criteria:\n- Age > 18\nExclusion Criteria:\n- Platelets < 100,000/mm3\nKey Exclusion Criteria:\n- Pregnancy"
+    assert slice_criteria_text(text) == "Exclusion Criteria:\n- Platelets < 100,000/mm3"
+
+def test_header_line_without_lab_keeps_only_the_header_words():
+    assert slice_criteria_text("Inclusion criteria: age >= 18\n- platelets > 100") == "Inclusion criteria\n- platelets > 100"
+
+def test_token_savings():
+    texts = pd.Series(["Inclusion Criteria:\n- Age > 18\n" + "Filler sentence. " * 20 + "\n- ANC > 1.5", None])
+    sliced, savings = slice_criteria(texts, pd.Series(["NCT1", "NCT2"]))
+    assert sliced.tolist() == ["Inclusion Criteria:\n- ANC > 1.5", ""]
+    assert savings["saved_tokens"].iloc[0] > 0
+    assert (savings["original_tokens"] - savings["sliced_tokens"] == savings["saved_tokens"]).all()
+
+def test_patterns_capture_the_section_name():
+    assert SECTION_HEADER_PATTERN.match("Key Exclusion Criteria:").group(1).lower() == "exclusion"
+    assert SECTION_START_PATTERN.match("Inclusion: ANC > 1.5").group(1).lower() == "inclusion"
@@ -0,0 +1,52 @@
+import json
+import numpy as np
+from eligibility_matcher import EligibilityMatcher
+from lab_store import LabRequirementStore
+
+HB = "Hemoglobin required"
+PLT = "Platelet count required"
+
+RECORDS = [
+    {"NCTId": "NCT1", "DatabaseReadyLabValues": json.dumps({HB: [90.0, 250.0], PLT: [100.0, 1500.0]})},
+    {"NCTId": "NCT2", "DatabaseReadyLabValues": json.dumps({HB: [0.0, 89.0]})},
+    {"NCTId": "NCT3", "DatabaseReadyLabValues": "{}"},
+]
+
+def test_constraint_free_trial_is_on_the_trial_axis():
+    matcher = EligibilityMatcher.from_records(RECORDS)
+    assert matcher.nct_ids.tolist() == ["NCT1", "NCT2", "NCT3"]
+    assert np.isnan(matcher.lower[2]).all() and np.isnan(matcher.upper[2]).all()
+
+def test_constraint_free_trial_is_accepted():
+    matcher = EligibilityMatcher.from_records(RECORDS)
+    assert matcher.trials_accepting(HB, 100.0) == ["NCT1"]
+    assert matcher.trials_accepting(HB, 100.0, include_unconstrained=True) == ["NCT1", "NCT3"]
+    assert matcher.trials_accepting(PLT, 50.0, include_unconstrained=True) == ["NCT2", "NCT3"]
+
+def test_eligible_trials():
+    matcher = EligibilityMatcher.from_records(RECORDS)
+    assert matcher.eligible_trials({HB: 100.0, PLT: 200.0}) == ["NCT1", "NCT3"]
+    assert matcher.eligible_trials({HB: 80.0}) == ["NCT2", "NCT3"]
+    # A missing value only passes trials that do not constrain that lab, unless missing_ok
+    assert matcher.eligible_trials({HB: 100.0}) == ["NCT3"]
+    assert matcher.eligible_trials({HB: 100.0}, missing_ok=True) == ["NCT1", "NCT3"]
+
+def test_interval_index_matches_the_matrix():
+    rng = np.random.default_rng(0)
+    lower = rng.uniform(0, 200, 500)
+    upper = lower + rng.uniform(0, 100, 500)
+    lower[::7] = np.nan
+    upper[::11] = np.nan
+    bounds_lower = np.full((500, 1), np.nan)
+    bounds_upper = np.full((500, 1), np.nan)
+    bounds_lower[:, 0], bounds_upper[:, 0] = lower, upper
+    matcher = EligibilityMatcher([f"NCT{i}" for i in range(500)], bounds_lower, bounds_upper, labs=[HB])
+    for value in (0.0, 50.0, 123.4, 250.0, 400.0):
+        expected = np.flatnonzero(matcher.eligibility([{HB: value}])[0] & matcher.constrained[:, 0])
+        assert matcher.trials_accepting(HB, value) == [f"NCT{i}" for i in expected]
+
+def test_from_store_keeps_processed_trials_without_rows():
+    store = LabRequirementStore().add_records(RECORDS[:1], column_name="DatabaseReadyLabValues", kind="database_ready")
+    matcher = EligibilityMatcher.from_store(store, nct_ids=["NCT9", "NCT1"])
+    assert matcher.nct_ids.tolist() == ["NCT9", "NCT1"]
+    assert matcher.eligible_trials({HB: 50.0, PLT: 50.0}) == ["NCT9"]
@@ -0,0 +1,53 @@
+import json
+import pandas as pd
+import pytest
+import concurrency
+import model_client
+from fused_extraction import database_ready_ranges, extract_and_normalize, extract_and_normalize_text, validate_fused_response
+
+HB = "Hemoglobin required"
+
+def test_valid_fused_response():
+    lab_values, model_ranges = validate_fused_response(json.dumps({HB: {"relation": "greater than", "value": "9 g/dL", "range": [91.0, 250.0]}}))
+    assert lab_values == {HB: ["greater than", "9 g/dL"]}
+    assert database_ready_ranges(lab_values, model_ranges) == {HB: [91.0, 250.0]}
+
+def test_model_range_is_used_only_when_it_passes_the_range_check():
+    assert database_ready_ranges({HB: ["about", "9"]}, {HB: [80.0, 300.0]}) == {HB: [80.0, 250.0]}
+    assert database_ready_ranges({HB: ["about", "9"]}, {HB: [300.0, 80.0]}) == {}
+
+class CountingLimiter:
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self):
+        self.acquired += 1
+
+def test_fallback_calls_go_through_the_limiter_and_retries(monkeypatch):
+    limiter = CountingLimiter()
+    monkeypatch.setattr(concurrency, "make_rate_limiter", lambda requests_per_minute: limiter if requests_per_minute else None)
+    failures = []
+
+    # The fused response fails the schema; the fallback extraction times out once, then answers
+    def responder(prompt):
+        if "range" in prompt and "[lower, upper]" in prompt and "Text: " in prompt and '"relation"' in prompt:
+            return "not json"
+        if "Given a JSON input" in prompt:
+            return json.dumps({HB: [90.0, 250.0]})
+        if not failures:
+            failures.append(prompt)
+            raise TimeoutError("timed out")
+        return json.dumps({HB: ["about", "9 g/dL"]})
+    monkeypatch.setattr(model_client, "_backend", model_client.StubBackend(responder=responder))
+    monkeypatch.setattr(concurrency.time, "sleep", lambda seconds: None)
+    df = pd.DataFrame({"NCTId": ["NCT1"], "concatenated_text": ["Hemoglobin about 9 g/dL"]})
+
+    lab_values, database_ready = extract_and_normalize(df, max_workers=1, requests_per_minute=60, use_cache=False)
+    assert json.loads(database_ready[0]["DatabaseReadyLabValues"]) == {HB: [90.0, 250.0]}
+    # fused call, failed extraction, retried extraction, normalization
+    assert limiter.acquired == 4
+
+def test_timeout_reaches_the_model_call(monkeypatch):
+    monkeypatch.setattr(model_client, "_backend", model_client.StubBackend(latency=1.0))
+    with pytest.raises(TimeoutError):
+        extract_and_normalize_text("NCT1", "Hemoglobin > 9 g/dL", use_cache=False, timeout=0.01)
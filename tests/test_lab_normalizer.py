@@ -0,0 +1,81 @@
+import pytest
+from lab_normalizer import (LAB_STANDARDS, STANDARD_RANGES_TEXT, UnparseableLabValue, normalize_entry, normalize_lab_values,
+                            parse_quantity, validate_range)
+
+HB = "Hemoglobin required"
+ANC = "Absolute neutrophil count (ANC) or absolute granulocyte count required"
+CREATININE = "Creatinine required"
+
+def test_operators_use_the_lab_step():
+    assert normalize_entry(HB, ["greater than", "90 g/L"]) == [91.0, 250.0]
+    assert normalize_entry(HB, ["less than", "90 g/L"]) == [0.0, 89.0]
+    assert normalize_entry(ANC, ["greater than", "1.5 x10^9/L"]) == [1.6, 9.9]
+    assert normalize_entry(CREATININE, ["less than", "1.5 mg/dL"]) == [0.0, 1.49]
+    assert normalize_entry(HB, ["less than or equal to", "90 g/L"]) == [0.0, 90.0]
+    assert normalize_entry(HB, [">=", "9 g/dL"]) == [90.0, 250.0]
+
+def test_lower_and_upper_limits():
+    assert normalize_entry(ANC, ["1.5", "9.0 x10^9/L"]) == [1.5, 9.0]
+    assert normalize_entry(ANC, ["1500/mm3", "9000/mm3"]) == [1.5, 9.0]
+
+def test_number_without_a_unit_is_rejected():
+    for entry in (["greater than or equal to", "9"], [">=", 9], ["9", "12"]):
+        with pytest.raises(UnparseableLabValue):
+            normalize_entry(HB, entry)
+
+def test_empty_entry_returns_none():
+    assert normalize_entry(HB, ["", ""]) is None
+
+def test_unit_conversion():
+    assert parse_quantity("1500/mm3", ANC) == pytest.approx(1.5)
+    assert parse_quantity("120 umol/L", CREATININE) == pytest.approx(120 / 88.4)
+
+def test_unknown_unit_is_rejected():
+    with pytest.raises(UnparseableLabValue):
+        normalize_entry(HB, ["greater than", "9 furlongs"])
+
+def test_range_below_the_lab_minimum_is_rejected():
+    with pytest.raises(UnparseableLabValue):
+        normalize_entry(HB, ["less than", "0"])
+
+def test_range_above_the_lab_maximum_is_rejected():
+    with pytest.raises(UnparseableLabValue):
+        normalize_entry(HB, ["greater than", "300 g/L"])
+
+def test_bounds_outside_the_lab_range_are_clamped():
+    assert normalize_entry(HB, ["less than or equal to", "300 g/L"]) == [0.0, 250.0]
+    assert validate_range(ANC, [-1, 20]) == [0.0, 9.9]
+
+def test_validate_range_rejects_inverted_and_malformed_ranges():
+    for lab_range in ([5.0, 1.0], [1.0], ["1", "2"], [True, 2.0], None):
+        with pytest.raises(UnparseableLabValue):
+            validate_range(ANC, lab_range)
+
+def test_rejected_entries_go_to_the_model_fallback():
+    normalized, unparsed = normalize_lab_values('{"Hemoglobin required": ["less than", "0 g/L"], "Platelet count required": [">", "100 x10^9/L"]}')
+    assert normalized == {"Platelet count required": [101.0, 1500.0]}
+    assert unparsed == {HB: ["less than", "0 g/L"]}
+
+def test_prompt_table_lists_every_step():
+    for lab, spec in LAB_STANDARDS.items():
+        assert f"- {lab}: {spec['unit']}, range [{spec['min']}, {spec['max']}], step {spec['step']}" in STANDARD_RANGES_TEXT
+
+def test_model_fallback_ranges_pass_the_same_check(monkeypatch):
+    import json
+    import model_client
+    from module2 import normalize_record
+    monkeypatch.setattr(model_client, "_backend", model_client.StubBackend(
+        responder=lambda prompt: json.dumps({HB: [0.0, -1.0], "Platelet count required": [50.0, 2000.0]})))
+    output = normalize_record("prompt", json.dumps({HB: ["less than", "0"], "Platelet count required": ["about", "50"]}),
+                              use_cache=False)
+    assert json.loads(output) == {"Platelet count required": [50.0, 1500.0]}
+
+def test_model_reply_for_unparseable_lab_values_is_validated(monkeypatch):
+    import json
+    import model_client
+    from module2 import normalize_record
+    reply = "Here you go:\n```json\n" + json.dumps({HB: [300.0, -5.0], "platelets required": [50.0, 2000.0], "Age": [18, 99]}) + "\n```"
+    monkeypatch.setattr(model_client, "_backend", model_client.StubBackend(responder=lambda prompt: reply))
+    assert json.loads(normalize_record("prompt", "Hemoglobin at least 9", use_cache=False)) == {"Platelet count required": [50.0, 1500.0]}
+    monkeypatch.setattr(model_client, "_backend", model_client.StubBackend(responder=lambda prompt: "Sorry, I cannot help."))
+    assert json.loads(normalize_record("prompt", "Hemoglobin at least 9", use_cache=False)) == {}
@@ -0,0 +1,35 @@
+import json
+import pandas as pd
+import pytest
+from lab_normalizer import LAB_STANDARDS
+from lab_prefilter import EMPTY_LAB_VALUES, LAB_NAME_PATTERNS, has_lab_terms
+
+@pytest.mark.parametrize("text", [
+    "Hgb >= 9 g/dL", "Hb ≥ 9", "Haemoglobin at least 90 g/L", "HCT≥30%",
+    "PLT>100", "platelets ≥ 100 x 10^9/L", "WBC≥3,000/µL", "leucocytes > 3",
+    "ANC ≥ 1500/mm³", "neutrophils ≥1.5×10⁹/L", "Serum creatinine ≤ 1.5 mg/dL", "creatinine ≤ 133 µmol/L",
+    "CrCl ≥ 50", "eGFR > 60 mL/min", "AST ≤ 2.5 x ULN", "SGPT < 3 times upper limit of normal",
+    "ALT/AST ≤ 3 × ULN", "Alk phos < 2.5", "total bilirubin ≤ 1.5 × ULN", "albumin > 3 g/dL",
+    # Thresholds written without the lab name
+    "≤ 3×ULN", "< 1.5 x the upper limit of normal", "≥ 1.5 × 10⁹/L", "≥ 1.5 x10^9/L", "≥ 100,000/mm3",
+])
+def test_lab_phrasing_variants_are_kept(text):
+    assert has_lab_terms(pd.Series([text])).iloc[0]
+
+@pytest.mark.parametrize("text", [
+    "Age 18 years or older", "ECOG 0-1", "fasting for 8 hours", "Castleman disease",
+    "albuminuria", "Halt therapy", "Past medical history", "alternative treatment",
+])
+def test_text_without_labs_is_skipped(text):
+    assert not has_lab_terms(pd.Series([text])).iloc[0]
+
+def test_missing_text_is_skipped():
+    assert has_lab_terms(pd.Series([None, float("nan"), ""])).tolist() == [False, False, False]
+
+def test_name_patterns_pick_the_lab():
+    assert LAB_NAME_PATTERNS["Hemoglobin required"].search("Hgb ≥ 9")
+    assert LAB_NAME_PATTERNS["Creatinine clearance or GFR required"].search("eGFR ≥ 60")
+    assert not LAB_NAME_PATTERNS["AST required"].search("fasting")
+
+def test_empty_result_has_every_lab():
+    assert json.loads(EMPTY_LAB_VALUES) == {lab: ["", ""] for lab in LAB_STANDARDS}
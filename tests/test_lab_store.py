@@ -0,0 +1,89 @@
+import json
+import threading
+import numpy as np
+from lab_store import LabRequirementStore, decode_lab_values, infer_section
+
+HB = "Hemoglobin required"
+PLT = "Platelet count required"
+
+def test_rows_are_typed_with_bounds_in_the_standard_unit():
+    store = LabRequirementStore()
+    store.add("NCT1", json.dumps({HB: ["greater than", "9 g/dL"], PLT: ["", ""], "ALT required": ["<=", "2.5 x ULN"]}))
+    frame = store.frame
+    assert frame['lab'].dtype == 'category' and frame['lower'].dtype == np.float64
+    rows = frame.set_index('lab')
+    assert rows.loc[HB, 'lower'] == 90.0 and np.isnan(rows.loc[HB, 'upper'])
+    assert rows.loc["ALT required", 'upper'] == 2.5
+    assert PLT not in rows.index
+
+def test_frame_is_built_once_between_adds():
+    store = LabRequirementStore()
+    store.add("NCT1", json.dumps({HB: [">", "90"]}))
+    first = store.frame
+    assert store.frame is first
+    store.add("NCT2", json.dumps({PLT: [">", "100"]}))
+    assert store.frame is not first
+    assert store.frame['NCTId'].tolist() == ["NCT1", "NCT2"]
+
+def test_invalid_json_falls_back_to_regex():
+    assert decode_lab_values('junk "Hemoglobin required": ["less than", "9 g/dL"], "Platelet count required": [1.0, 2.0')[HB] == ["less than", "9 g/dL"]
+
+def test_section_of_a_lab_on_a_header_line():
+    text = "Inclusion Criteria:\n- Age > 18\nExclusion criteria: hemoglobin < 9 g/dL\n- platelets < 100"
+    assert infer_section(text, HB) == "exclusion"
+    assert infer_section(text, PLT) == "exclusion"
+    assert infer_section("Inclusion Criteria:\nPlatelets > 100", PLT) == "inclusion"
+
+def test_display_table_and_trials_accepting():
+    store = LabRequirementStore()
+    store.add("NCT1", json.dumps({HB: [90.0, 250.0]}), kind="database_ready")
+    store.add("NCT2", json.dumps({HB: [0.0, 89.0]}), kind="database_ready")
+    assert store.trials_accepting(HB, 100.0) == ["NCT1"]
+    table = store.display_table(kind="database_ready", with_units=True, nct_ids=["NCT2", "NCT1", "NCT3"])
+    assert table['NCTId'].tolist() == ["NCT2", "NCT1", "NCT3"]
+    assert table[f"{HB} (g/L)"].iloc[0] == "[0.0, 89.0]"
+
+def test_merge_replaces_rows_of_the_same_trial_and_kind(tmp_path):
+    path = str(tmp_path / "labs.parquet")
+    first = LabRequirementStore()
+    first.add("NCT1", json.dumps({HB: [">", "90"]}))
+    first.add("NCT2", json.dumps({PLT: [">", "100"]}))
+    first.merge_into(path)
+    second = LabRequirementStore()
+    second.add("NCT1", json.dumps({PLT: ["<", "50"]}))
+    second.merge_into(path)
+    merged = LabRequirementStore.load(path).frame
+    assert sorted(zip(merged['NCTId'], merged['lab'].astype(str))) == [("NCT1", PLT), ("NCT2", PLT)]
+    assert not list(tmp_path.glob("*.tmp-*"))
+
+def test_merge_drops_rows_of_trials_without_new_requirements(tmp_path):
+    path = str(tmp_path / "labs.parquet")
+    first = LabRequirementStore()
+    first.add("NCT1", json.dumps({HB: [">", "9 g/dL"]}))
+    first.add("NCT1", json.dumps({HB: [90.0, 250.0]}), kind="database_ready")
+    first.merge_into(path)
+    second = LabRequirementStore()
+    second.add("NCT1", json.dumps({HB: ["", ""]}))
+    second.merge_into(path)
+    merged = LabRequirementStore.load(path).frame
+    assert merged['kind'].astype(str).tolist() == ["database_ready"]
+
+def test_display_table_keeps_trials_without_ranges():
+    store = LabRequirementStore()
+    store.add("NCT1", json.dumps({}), kind="database_ready")
+    store.add("NCT2", json.dumps({HB: [90.0, 250.0]}), kind="database_ready")
+    assert store.display_table(kind="database_ready", nct_ids=["NCT1", "NCT2"])['NCTId'].tolist() == ["NCT1", "NCT2"]
+
+def test_concurrent_merges_keep_every_trial(tmp_path):
+    path = str(tmp_path / "labs.parquet")
+
+    def merge(number):
+        store = LabRequirementStore()
+        store.add(f"NCT{number}", json.dumps({HB: [">", str(number)]}))
+        store.merge_into(path)
+    threads = [threading.Thread(target=merge, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(LabRequirementStore.load(path).frame['NCTId']) == [f"NCT{number}" for number in range(8)]
@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+from memory_report import estimate_bytes, format_bytes, session_memory
+
+def frame(rows=10000):
+    return pd.DataFrame({"NCTId": [f"NCT{i:08d}" for i in range(rows)], "value": np.arange(rows, dtype=np.float64)})
+
+def test_shared_frame_is_counted_once():
+    df = frame()
+    size = estimate_bytes(df)
+    assert estimate_bytes([df, df, {"again": df}]) < 2 * size
+
+def test_shared_frame_is_counted_under_one_session_key():
+    df = frame()
+    rows = session_memory({"df_all": df, "filtered": df, "small": [1, 2, 3]})
+    sizes = {row["key"]: row["bytes"] for row in rows}
+    assert sizes["df_all"] >= estimate_bytes(df)
+    assert sizes["filtered"] < 1000
+    assert rows[0]["key"] == "df_all"
+
+def test_array_view_does_not_count_the_buffer_again():
+    values = np.zeros(100000)
+    assert estimate_bytes(values[::2]) < 1000
+    assert estimate_bytes(values) >= values.nbytes
+
+def test_objects_are_followed_through_attributes():
+    class Holder:
+        def __init__(self):
+            self.frame = frame()
+    assert estimate_bytes(Holder()) >= estimate_bytes(frame())
+
+def test_excluded_keys_are_skipped():
+    assert [row["key"] for row in session_memory({"a": 1, "b": 2}, exclude=("a",))] == ["b"]
+
+def test_format_bytes():
+    assert [format_bytes(size) for size in (512, 2048, 3 * 2**20, 5 * 2**30)] == ["512 B", "2.0 KiB", "3.0 MiB", "5.0 GiB"]
@@ -0,0 +1,42 @@
+import concurrency
+from concurrency import call_with_retry
+from metrics import MetricsRegistry
+
+def test_repeated_jsonl_exports_do_not_duplicate_events(tmp_path):
+    registry = MetricsRegistry()
+    registry.observe("stage", "parse", 0.1)
+    path = tmp_path / "metrics.jsonl"
+    registry.export_jsonl(path)
+    registry.observe("stage", "render", 0.2)
+    registry.export_jsonl(path)
+    assert len(path.read_text().splitlines()) == 2
+
+def test_prometheus_families_have_help_and_type_before_samples():
+    registry = MetricsRegistry()
+    registry.increment("model_calls", "extract")
+    registry.increment("model_calls", "fused")
+    registry.observe("model_call", "extract", 0.2)
+    lines = registry.to_prometheus().splitlines()
+    assert lines[:2] == ["# HELP smartlab_model_calls_total Model calls that returned a response.",
+                         "# TYPE smartlab_model_calls_total counter"]
+    assert "# TYPE smartlab_model_call_seconds histogram" in lines
+    families = {}
+    for line in lines:
+        if line.startswith("# TYPE "):
+            families[line.split()[2]] = True
+        elif not line.startswith("#"):
+            assert any(line.startswith(family) for family in families), line
+    assert lines.count("# TYPE smartlab_model_calls_total counter") == 1
+
+def test_retries_are_labelled_with_the_stage(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(concurrency, "metrics", registry)
+    attempts = []
+
+    def flaky(item):
+        attempts.append(item)
+        if len(attempts) < 3:
+            raise TimeoutError("timed out")
+        return item
+    assert call_with_retry(flaky, "x", max_retries=3, base_delay=0.0, stage="fused") == "x"
+    assert registry.counters[("retries", "fused")] == 2
@@ -0,0 +1,31 @@
+import time
+import pandas as pd
+import pytest
+import model_client
+from metrics import MetricsRegistry
+from module1 import extract_lab_values
+
+def test_gemini_backend_requires_an_api_key(monkeypatch):
+    monkeypatch.delenv("GEMINI_API_KEY", raising=False)
+    with pytest.raises(RuntimeError, match="GEMINI_API_KEY"):
+        model_client.GeminiBackend()
+
+def test_extract_lab_values_passes_the_timeout(monkeypatch):
+    monkeypatch.setattr(model_client, "_backend", model_client.StubBackend(latency=0.2))
+    df = pd.DataFrame({"NCTId": ["NCT1"], "concatenated_text": ["Hemoglobin > 9 g/dL"]})
+    with pytest.raises(TimeoutError):
+        extract_lab_values(df, max_workers=1, max_retries=0, use_cache=False, timeout=0.01)
+
+def test_stub_time_to_first_token_is_measured(monkeypatch):
+    registry = MetricsRegistry()
+    monkeypatch.setattr(model_client, "metrics", registry)
+
+    # A slow responder delays the first chunk: the measured TTFT includes it, the planned latency does not
+    def responder(prompt):
+        time.sleep(0.05)
+        return "x" * 1000
+    backend = model_client.StubBackend(latency=0.05, responder=responder)
+    assert backend.generate("prompt") == "x" * 1000
+    key = ("time_to_first_token", "inline")
+    assert registry.latency_count[key] == 1
+    assert registry.latency_sum[key] >= 0.1
@@ -0,0 +1,50 @@
+import pytest
+import model_client
+import response_cache
+from benchmark import synthetic_response, synthetic_trials
+from prefetch import ExtractionPrefetcher
+from response_cache import ResponseCache
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    monkeypatch.setattr(response_cache, "_default_cache", ResponseCache(str(tmp_path / "responses.sqlite3")))
+
+    def use_stub(latency=0.0):
+        stub = model_client.StubBackend(latency=latency, responder=synthetic_response)
+        monkeypatch.setattr(model_client, "_backend", stub)
+        return stub
+    return use_stub
+
+def test_prefetch_is_capped_and_fills_the_cache(backend):
+    stub = backend()
+    prefetcher = ExtractionPrefetcher(max_trials=5, max_workers=2)
+    prefetcher.start(synthetic_trials(30, lab_density=1.0))
+    prefetcher.thread.join(timeout=10)
+    assert prefetcher.status() == {"done": 5, "total": 5, "running": False, "error": None}
+    assert stub.calls == 5
+    assert response_cache.get_cache().stats()["entries"] == 5
+
+def test_cancel_stops_the_prefetch(backend):
+    stub = backend(latency=0.05)
+    prefetcher = ExtractionPrefetcher(max_trials=20, max_workers=1)
+    prefetcher.start(synthetic_trials(20, lab_density=1.0))
+    prefetcher.cancel()
+    prefetcher.thread.join(timeout=10)
+    status = prefetcher.status()
+    assert not status["running"] and status["done"] < 20
+    assert stub.calls < 20
+
+def test_new_start_cancels_the_previous_prefetch(backend):
+    backend(latency=0.05)
+    prefetcher = ExtractionPrefetcher(max_trials=20, max_workers=1)
+    prefetcher.start(synthetic_trials(20, lab_density=1.0))
+    first = prefetcher.thread
+    prefetcher.start(synthetic_trials(3, lab_density=1.0, seed=1))
+    first.join(timeout=10)
+    prefetcher.thread.join(timeout=10)
+    assert prefetcher.status()["total"] == 3 and prefetcher.status()["done"] == 3
+
+def test_empty_selection_starts_nothing():
+    prefetcher = ExtractionPrefetcher()
+    prefetcher.start(synthetic_trials(5).head(0))
+    assert prefetcher.thread is None and prefetcher.status()["total"] == 0
@@ -0,0 +1,89 @@
+import threading
+import pytest
+import response_cache
+from response_cache import ResponseCache, cached_call
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite3"))
+    monkeypatch.setattr(response_cache, "_default_cache", cache)
+    return cache
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "time", lambda: now[0])
+    return now
+
+def test_hits_and_misses_are_counted(cache):
+    key = cache.make_key("model", "prompt", "text")
+    assert cache.get(key) is None
+    cache.set(key, "model", "answer")
+    assert cache.get(key) == "answer"
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "entries": 1}
+
+def test_key_covers_model_prompt_and_text():
+    keys = {ResponseCache.make_key(*parts) for parts in [("m", "p", "t"), ("m2", "p", "t"), ("m", "p2", "t"), ("m", "p", "t2"), ("m", "pt", "")]}
+    assert len(keys) == 5
+
+def test_entries_expire_after_max_age(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "ttl.sqlite3"), max_age_seconds=60)
+    cache.set("key", "model", "answer")
+    clock[0] += 59
+    assert cache.get("key") == "answer"
+    clock[0] += 2
+    assert cache.get("key") is None
+    assert cache.stats()["entries"] == 0
+
+def test_least_recently_used_entries_are_evicted(tmp_path, clock):
+    cache = ResponseCache(str(tmp_path / "lru.sqlite3"), max_entries=2, evict_every=1)
+    for key in ("a", "b"):
+        clock[0] += 1
+        cache.set(key, "model", key)
+    clock[0] += 1
+    cache.get("a")
+    clock[0] += 1
+    cache.set("c", "model", "c")
+    assert [cache.get(key) for key in ("a", "b", "c")] == ["a", None, "c"]
+
+def test_cached_call_reuses_valid_responses_only(cache):
+    calls = []
+
+    def generate():
+        calls.append(1)
+        return "not json" if len(calls) == 1 else "{}"
+    is_valid = lambda response: response.startswith("{")
+    assert cached_call("model", "prompt", "text", generate, is_valid=is_valid) == "not json"
+    assert cached_call("model", "prompt", "text", generate, is_valid=is_valid) == "{}"
+    assert cached_call("model", "prompt", "text", generate, is_valid=is_valid) == "{}"
+    assert len(calls) == 2
+
+def test_use_cache_false_bypasses_the_cache(cache):
+    calls = []
+    generate = lambda: calls.append(1) or "answer"
+    for _ in range(2):
+        assert cached_call("model", "prompt", "text", generate, use_cache=False) == "answer"
+    assert len(calls) == 2
+    assert cache.stats()["entries"] == 0 and cache.stats()["misses"] == 0
+
+def test_threads_share_the_file(cache):
+    errors = []
+
+    def work(number):
+        try:
+            for i in range(20):
+                key = f"{number}-{i}"
+                cached_call("model", "prompt", key, lambda: key)
+                assert cached_call("model", "prompt", key, lambda: "recomputed") == key
+        except Exception as e:
+            errors.append(e)
+    threads = [threading.Thread(target=work, args=(number,)) for number in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert cache.stats()["entries"] == 160
+    # A second process-level cache on the same file sees every entry (WAL mode)
+    assert ResponseCache(cache.path).stats()["entries"] == 160
+    assert cache.connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
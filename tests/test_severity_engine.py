@@ -0,0 +1,49 @@
+import itertools
+import numpy as np
+import pandas as pd
+import pytest
+from severity_engine import VARIANCE_COLUMNS, SeverityRule, classify_severity, severity_rules
+
+# The row-wise rules the engine replaced
+def old_categorize_severity(row):
+    if row['Start Date Variance (days)'] > 365 or row['Finish Date Variance (days)'] > 365:
+        return 'High Severity'
+    elif (90 <= row['Start Date Variance (days)'] <= 365) or (90 <= row['Finish Date Variance (days)'] <= 365):
+        return 'Medium Severity'
+    elif (0 <= row['Start Date Variance (days)'] < 90) or (0 <= row['Finish Date Variance (days)'] < 90):
+        return 'Low Severity'
+    elif row['Start Date Variance (days)'] < 0 or row['Finish Date Variance (days)'] < 0:
+        return 'Negative Variance'
+    else:
+        return 'No Variance'
+
+EDGES = [np.nan, -1, 0, 1, 89, 90, 91, 364, 365, 366, 1000]
+
+def test_default_rules_match_the_old_categorization():
+    df = pd.DataFrame(list(itertools.product(EDGES, EDGES)), columns=VARIANCE_COLUMNS)
+    expected = df.apply(old_categorize_severity, axis=1)
+    assert classify_severity(df).astype(str).tolist() == expected.tolist()
+
+def test_integer_and_nullable_columns():
+    df = pd.DataFrame({VARIANCE_COLUMNS[0]: pd.array([400, None, -5], dtype="Int64"),
+                       VARIANCE_COLUMNS[1]: [10, None, None]})
+    assert classify_severity(df).astype(str).tolist() == ['High Severity', 'No Variance', 'Negative Variance']
+
+def test_custom_thresholds():
+    df = pd.DataFrame({VARIANCE_COLUMNS[0]: [30, 60, 200], VARIANCE_COLUMNS[1]: [np.nan] * 3})
+    labels = classify_severity(df, severity_rules(medium_days=30, high_days=100))
+    assert labels.astype(str).tolist() == ['Medium Severity', 'Medium Severity', 'High Severity']
+
+def test_result_is_categorical_with_every_label():
+    labels = classify_severity(pd.DataFrame({column: [1.0] for column in VARIANCE_COLUMNS}))
+    assert list(labels.cat.categories) == ['High Severity', 'Medium Severity', 'Low Severity',
+                                          'Negative Variance', 'No Variance']
+
+@pytest.mark.parametrize("rule, text", [
+    (SeverityRule('High', lower=365, include_lower=False), "variance > 365 days"),
+    (SeverityRule('Medium', lower=90, upper=365), "90 ≤ variance ≤ 365 days"),
+    (SeverityRule('Low', lower=0, upper=90, include_upper=False), "0 ≤ variance < 90 days"),
+    (SeverityRule('Negative', upper=0, include_upper=False), "variance < 0 days"),
+])
+def test_describe(rule, text):
+    assert rule.describe() == text
@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+from trial_data import CONCATENATED_COLUMNS, prepare_trials, with_concatenated_text
+
+def raw_trials():
+    return pd.DataFrame({
+        "NCTId": ["NCT1", "NCT2"],
+        "BriefTitle": ["Title one", None],
+        "EligibilityCriteria": ["Inclusion Criteria:\nHemoglobin > 9 g/dL", np.nan],
+        "Keywords": [["a", "b"], []],
+        "Conditions": [["Lymphoma"], ["Asthma", "COPD"]],
+    })
+
+def test_concatenated_text_matches_the_original_row_join():
+    raw = raw_trials()
+    flattened = raw.apply(lambda column: column.map(lambda x: ', '.join(map(str, x)) if isinstance(x, list) else x))
+    expected = flattened[CONCATENATED_COLUMNS].apply(lambda row: "\n".join([str(cell) for cell in row]), axis=1)
+    assert prepare_trials(raw)['concatenated_text'].tolist() == expected.tolist()
+
+def test_lazy_concatenation_gives_the_same_text():
+    raw = raw_trials()
+    assert with_concatenated_text(prepare_trials(raw, concatenate=False))['concatenated_text'].tolist() == \
+        prepare_trials(raw)['concatenated_text'].tolist()
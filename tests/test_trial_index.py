@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from trial_index import TrialIndex
+
+VALUES = ["Non-Hodgkin Lymphoma", "lymphoma, follicular", None, "Breast Cancer", np.nan, "Asthma", "", "LYMPH node"]
+
+@pytest.fixture(params=["object", "arrow"])
+def frame(request):
+    values = pd.Series(VALUES, dtype=object)
+    if request.param == "arrow":
+        values = values.astype(object).where(values.notna(), None).astype(pd.ArrowDtype(pa.string()))
+    return pd.DataFrame({"Conditions": values, "BriefTitle": ["t"] * len(VALUES)})
+
+@pytest.mark.parametrize("query", ["lymphoma", "LYMPH", "ly", "cancer", "xyz", "a", "", "Lymph|Asthma", "^Breast"])
+def test_contains_matches_str_contains(frame, query):
+    index = TrialIndex(frame, ["Conditions"])
+    expected = frame["Conditions"].str.contains(query, case=False).fillna(False).to_numpy(dtype=bool)
+    assert index.contains("Conditions", query).tolist() == expected.tolist()
+
+def test_candidates_are_a_superset_of_matches(frame):
+    index = TrialIndex(frame, ["Conditions"])
+    assert set(index.candidates("Conditions", "lymphoma").tolist()) >= {0, 1}
+
+def test_postings_are_built_on_first_query(frame):
+    index = TrialIndex(frame, ["Conditions", "BriefTitle"])
+    assert index.postings == {}
+    index.contains("Conditions", "lymphoma")
+    assert list(index.postings) == ["Conditions"]
+
+def test_filter_ands_the_columns(frame):
+    index = TrialIndex(frame, ["Conditions", "BriefTitle"])
+    assert np.flatnonzero(index.filter({"Conditions": "lymph", "BriefTitle": "t"})).tolist() == [0, 1, 7]
+    assert not index.filter({"Conditions": "lymph", "BriefTitle": "missing"}).any()
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+from trial_search import TrialSearchIndex, tokenize
+
+@pytest.fixture
+def trials():
+    return pd.DataFrame({
+        "NCTId": ["NCT00000001", "NCT00000002", "NCT00000003", "NCT00000004"],
+        "Conditions": ["Breast Cancer", "Lymphoma", "Asthma", None],
+        "Keywords": ["chemotherapy", "lymphoma, rituximab", "inhaler", ""],
+        "BriefTitle": ["Chemotherapy in breast cancer", "Rituximab for lymphoma", "Inhaled steroids", "Healthy volunteers"],
+        "EligibilityCriteria": ["Hemoglobin > 9 g/dL", "Lymphoma confirmed; platelets > 100", "Asthma diagnosis", "No cancer history"],
+    })
+
+def test_tokenize_lowercases_and_skips_non_text():
+    assert tokenize("Non-Hodgkin LYMPHOMA, 2nd line") == ["non", "hodgkin", "lymphoma", "2nd", "line"]
+    assert tokenize(None) == []
+
+def test_title_and_condition_matches_rank_first(trials):
+    index = TrialSearchIndex.build(trials)
+    assert [nct_id for nct_id, _ in index.top_trials("cancer")] == ["NCT00000001", "NCT00000004"]
+    assert index.top_trials("lymphoma rituximab")[0][0] == "NCT00000002"
+
+def test_unknown_or_empty_query_returns_nothing(trials):
+    index = TrialSearchIndex.build(trials)
+    for query in ["zebra", "", "  "]:
+        positions, scores = index.search(query)
+        assert len(positions) == len(scores) == 0
+
+def test_top_k_keeps_the_best_scores(trials):
+    index = TrialSearchIndex.build(trials)
+    positions, scores = index.search("cancer lymphoma asthma", top_k=2)
+    all_positions, all_scores = index.search("cancer lymphoma asthma", top_k=10)
+    assert scores.tolist() == all_scores[:2].tolist()
+    assert positions.tolist() == all_positions[:2].tolist()
+
+def test_saved_index_loads_memory_mapped(trials, tmp_path):
+    index = TrialSearchIndex.build(trials)
+    index.save(tmp_path / "v1")
+    loaded = TrialSearchIndex.load(tmp_path / "v1")
+    assert isinstance(loaded.weights, np.memmap)
+    assert loaded.top_trials("breast chemotherapy") == index.top_trials("breast chemotherapy")
+
+def test_build_removes_older_versions(trials, tmp_path):
+    TrialSearchIndex.load_or_build(trials, str(tmp_path / "v1"))
+    (tmp_path / "v2.tmp-99999").mkdir()
+    index = TrialSearchIndex.load_or_build(trials, str(tmp_path / "v2"))
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["v2", "v2.tmp-99999"]
+    assert len(index) == len(trials)
+    # Loading an existing version leaves its siblings alone
+    (tmp_path / "v3").mkdir()
+    TrialSearchIndex.load_or_build(trials, str(tmp_path / "v2"))
+    assert (tmp_path / "v3").exists()
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+from trial_data import TRIAL_COLUMNS, data_version, load_trials, prepare_trials
+from trial_store import TrialStore, is_trial_store, main, write_trial_store
+
+def raw_trials():
+    return pd.DataFrame({
+        "NCTId": ["NCT3", "NCT1", "NCT2", "NCT4"],
+        "BriefTitle": ["Title three", "Title one", None, "Title four"],
+        "EligibilityCriteria": ["Platelets > 100", "Inclusion Criteria:\nHemoglobin > 9 g/dL", np.nan, ""],
+        "Keywords": [["x"], ["a", "b"], [], ["y"]],
+        "Conditions": [["Asthma"], ["Lymphoma"], ["Asthma", "COPD"], ["Healthy"]],
+    })
+
+def test_round_trip_matches_prepare_trials(tmp_path):
+    write_trial_store(prepare_trials(raw_trials(), concatenate=False), tmp_path / "store", shard_size=3)
+    expected = prepare_trials(raw_trials()).sort_values("NCTId").reset_index(drop=True)
+    loaded = load_trials(str(tmp_path / "store"))
+    assert loaded.columns.tolist() == expected.columns.tolist()
+    for column in expected.columns:
+        assert loaded[column].astype(object).where(loaded[column].notna(), None).tolist() == \
+            expected[column].astype(object).where(expected[column].notna(), None).tolist()
+    assert loaded['concatenated_text'].tolist() == expected['concatenated_text'].tolist()
+
+def test_shards_are_sorted_nct_id_ranges(tmp_path):
+    shards = write_trial_store(prepare_trials(raw_trials(), concatenate=False), tmp_path, shard_size=3)
+    assert [(shard["first_nct_id"], shard["last_nct_id"], shard["rows"]) for shard in shards] == \
+        [("NCT1", "NCT3", 3), ("NCT4", "NCT4", 1)]
+    store = TrialStore(tmp_path)
+    assert len(store) == 4
+    assert store.table.column_names == TRIAL_COLUMNS
+
+def test_missing_values_read_back_as_nan(tmp_path):
+    write_trial_store(prepare_trials(raw_trials(), concatenate=False), tmp_path)
+    frame = TrialStore(tmp_path).frame()
+    assert pd.isna(frame.loc[1, 'BriefTitle']) and pd.isna(frame.loc[1, 'EligibilityCriteria'])
+    assert isinstance(frame['EligibilityCriteria'].dtype, pd.ArrowDtype)
+
+def test_cli_converts_a_pickle(tmp_path):
+    raw_trials().to_pickle(tmp_path / "trials.pkl")
+    main([str(tmp_path / "trials.pkl"), str(tmp_path / "store")])
+    assert is_trial_store(tmp_path / "store") and not is_trial_store(tmp_path)
+    assert data_version(str(tmp_path / "store"))
@@ -0,0 +1,36 @@
+import io
+import pandas as pd
+import upload_cache
+from upload_cache import StageCache, file_digest
+
+def test_file_digest_keeps_the_read_position():
+    stream = io.BytesIO(b"Project,Baseline\nA,1\n")
+    stream.seek(3)
+    assert file_digest(stream) == file_digest(io.BytesIO(b"Project,Baseline\nA,1\n"))
+    assert stream.tell() == 3
+
+def test_stage_is_computed_once_per_key():
+    cache, calls = StageCache(), []
+    compute = lambda: calls.append(1) or pd.DataFrame({"a": [1, 2]})
+    cache.get_or_compute("read", ("digest", "a.csv"), compute)
+    cache.get_or_compute("read", ("digest", "a.csv"), compute)
+    cache.get_or_compute("read", ("digest", "a.xlsx"), compute)
+    assert len(calls) == 2
+    assert cache.stats()["hits"] == 1
+
+def test_callers_cannot_change_the_cached_frame(monkeypatch):
+    for cow in (True, False):
+        monkeypatch.setattr(upload_cache, "copy_on_write", lambda: cow)
+        cache = StageCache()
+        frame = cache.get_or_compute("read", ("digest",), lambda: pd.DataFrame({"a": [1, 2]}))
+        frame["a"] = frame["a"].map({1: "x", 2: "y"})
+        frame.loc[0, "b"] = 5
+        again = cache.get_or_compute("read", ("digest",), lambda: None)
+        assert again.columns.tolist() == ["a"] and again["a"].tolist() == [1, 2]
+
+def test_least_recently_used_entries_are_evicted():
+    cache = StageCache(max_bytes=10_000)
+    for key in range(5):
+        cache.get_or_compute("bytes", (key,), lambda: b"x" * 3000)
+    assert cache.stats()["bytes"] <= 10_000
+    assert ("bytes", 0) not in cache.entries and ("bytes", 4) in cache.entries
@@ -0,0 +1,61 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Trial data pickle, or a trial store directory written by trial_store.py
+DATA_FILE = os.environ.get("SMARTLAB_DATA", "clinical_trials_data_filtered.pkl")
+
+# Columns used by the app
+TRIAL_COLUMNS = ['NCTId', 'Conditions', 'Keywords', 'BriefTitle', 'EligibilityCriteria']
+# Order the columns are joined into concatenated_text: the column order of the data file, as the
+# original row-wise join used it. Changing it changes every prompt and every response cache key.
+CONCATENATED_COLUMNS = ['NCTId', 'BriefTitle', 'EligibilityCriteria', 'Keywords', 'Conditions']
+
+# Function to flatten list columns if necessary
+def flatten_list_columns(df):
+    for column in df.columns:
+        is_list = df[column].map(lambda x: isinstance(x, list))
+        if is_list.any():
+            df[column] = df[column].where(~is_list, df[column][is_list].map(lambda x: ', '.join(map(str, x))))
+    return df
+
+# Function to build the text sent to the model by joining every trial column, one per line
+def build_concatenated_text(df, columns=CONCATENATED_COLUMNS):
+    texts = [pd.Series(column_text(df[column]), index=df.index) for column in columns]
+    return texts[0].str.cat(texts[1:], sep="\n")
+
+def column_text(values):
+    # Arrow-backed columns (trial store) read missing values back as NaN, like the pickle
+    if isinstance(values.dtype, pd.ArrowDtype):
+        values = values.astype(object).where(values.notna(), np.nan)
+    # numpy's str conversion matches str(cell) for missing values ("nan", "None") across pandas versions
+    return np.asarray(values, dtype=object).astype(str)
+
+# Function to turn the raw registry frame into the frame the app filters and extracts from.
+# With concatenate=False the concatenated_text column (a second copy of every text) is left
+# to be built for the selected rows only, see with_concatenated_text.
+def prepare_trials(df, concatenate=True):
+    df = flatten_list_columns(df[TRIAL_COLUMNS].copy())
+    if concatenate:
+        df['concatenated_text'] = build_concatenated_text(df)
+    return df
+
+# Function to load and prepare the trial data file or trial store
+def load_trials(path=DATA_FILE, concatenate=True):
+    from trial_store import is_trial_store, load_trial_store
+    if is_trial_store(path):
+        df = load_trial_store(path)
+        return with_concatenated_text(df) if concatenate else df
+    return prepare_trials(pd.read_pickle(path), concatenate)
+
+# Version of the data file or store, so cached data and indexes are rebuilt when it is replaced
+def data_version(path=DATA_FILE):
+    from trial_store import MANIFEST_FILE, is_trial_store
+    stat = os.stat(os.path.join(path, MANIFEST_FILE) if is_trial_store(path) else path)
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+# Function to return df with a concatenated_text column, building it only when it is missing
+def with_concatenated_text(df):
+    if 'concatenated_text' in df:
+        return df
+    return df.assign(concatenated_text=build_concatenated_text(df))
@@ -0,0 +1,80 @@
+import re
+import threading
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+
+# Characters that make a str.contains pattern a real regex rather than a plain substring
+REGEX_METACHARACTERS = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+# Trigram index over the text columns used by the sidebar filter. Each column maps every
+# lowercase 3-character substring to the sorted row positions that contain it, so a
+# substring query only has to verify the rows in the intersection of its trigram postings.
+# A column's postings are built on its first non-empty query, so a memory-mapped column
+# (EligibilityCriteria from the trial store) is not read until someone filters on it.
+class TrialIndex:
+    def __init__(self, df, columns):
+        self.columns = list(columns)
+        self.num_rows = len(df)
+        self.texts = {column: df[column] for column in self.columns}
+        self.postings = {}
+        self.lock = threading.Lock()
+
+    def postings_for(self, column):
+        with self.lock:
+            if column not in self.postings:
+                self.postings[column] = self.build_postings(self.texts[column])
+            return self.postings[column]
+
+    @staticmethod
+    def build_postings(values):
+        postings = defaultdict(list)
+        for position, value in enumerate(values):
+            if not isinstance(value, str):
+                continue
+            text = value.lower()
+            for trigram in {text[i:i + 3] for i in range(len(text) - 2)}:
+                postings[trigram].append(position)
+        return {trigram: np.asarray(rows, dtype=np.int32) for trigram, rows in postings.items()}
+
+    # Row positions that may contain query (a superset of the true matches)
+    def candidates(self, column, query):
+        text = query.lower()
+        trigrams = {text[i:i + 3] for i in range(len(text) - 2)}
+        if not trigrams:
+            return np.arange(self.num_rows, dtype=np.int32)
+        postings = self.postings_for(column)
+        lists = sorted((postings.get(trigram, np.empty(0, dtype=np.int32)) for trigram in trigrams), key=len)
+        rows = lists[0]
+        for other in lists[1:]:
+            if rows.size == 0:
+                break
+            rows = np.intersect1d(rows, other, assume_unique=True)
+        return rows
+
+    # Same result as values.str.contains(query, case=False) with missing values treated as no match
+    def contains(self, column, query):
+        values = self.texts[column]
+        if REGEX_METACHARACTERS.search(query):
+            return values.str.contains(query, case=False).fillna(False).to_numpy(dtype=bool)
+        mask = np.zeros(self.num_rows, dtype=bool)
+        if query == "":
+            if isinstance(values.dtype, pd.ArrowDtype):
+                mask[:] = values.notna().to_numpy(dtype=bool)
+            else:
+                mask[:] = values.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
+            return mask
+        rows = self.candidates(column, query)
+        if rows.size:
+            matches = values.iloc[rows].str.contains(query, case=False, regex=False).fillna(False)
+            mask[rows[matches.to_numpy(dtype=bool)]] = True
+        return mask
+
+    # Function to AND together one substring filter per column, e.g. {"Conditions": "lymphoma"}
+    def filter(self, queries):
+        mask = np.ones(self.num_rows, dtype=bool)
+        for column, query in queries.items():
+            mask &= self.contains(column, query)
+            if not mask.any():
+                break
+        return mask
@@ -0,0 +1,135 @@
+import json
+import os
+import re
+import shutil
+from collections import Counter
+import numpy as np
+
+SEARCH_COLUMNS = ['Conditions', 'Keywords', 'BriefTitle', 'EligibilityCriteria']
+# Term-frequency weight of each column, so a match in a title or condition counts more than one in the criteria
+FIELD_WEIGHTS = {'Conditions': 3.0, 'Keywords': 2.0, 'BriefTitle': 2.0, 'EligibilityCriteria': 1.0}
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+MAX_TOKEN_LENGTH = 40
+INDEX_FILES = ("terms", "indptr", "doc_ids", "weights", "nct_ids")
+
+def tokenize(text):
+    if not isinstance(text, str):
+        return []
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if len(token) <= MAX_TOKEN_LENGTH]
+
+# Ranked free-text search over the trial columns with BM25 weights held in a term-major sparse
+# matrix (CSR over terms): the postings of term t are doc_ids/weights[indptr[t]:indptr[t + 1]].
+# Scoring a query touches only the postings of its terms, so latency follows the query's posting
+# lengths rather than the number of trials. Document ids are row positions in the indexed frame.
+class TrialSearchIndex:
+    def __init__(self, terms, indptr, doc_ids, weights, nct_ids):
+        self.terms = terms
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.weights = weights
+        self.nct_ids = nct_ids
+
+    # Function to build the index from a trial frame (one pass over the text, then array sorts)
+    @classmethod
+    def build(cls, df, columns=SEARCH_COLUMNS, k1=1.2, b=0.75):
+        vocabulary = {}
+        term_ids, doc_ids, frequencies = [], [], []
+        lengths = np.zeros(len(df), dtype=np.float64)
+        column_values = [(df[column].tolist(), FIELD_WEIGHTS.get(column, 1.0)) for column in columns]
+        for doc in range(len(df)):
+            counts = Counter()
+            for values, weight in column_values:
+                for token in tokenize(values[doc]):
+                    counts[token] += weight
+            lengths[doc] = sum(counts.values())
+            for token, count in counts.items():
+                term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                doc_ids.append(doc)
+                frequencies.append(count)
+
+        # Renumber terms in sorted order so queries can look them up with a binary search
+        terms = np.array(sorted(vocabulary), dtype=f"<U{max(map(len, vocabulary), default=1)}")
+        renumber = np.empty(len(vocabulary), dtype=np.int64)
+        renumber[[vocabulary[term] for term in terms.tolist()]] = np.arange(len(terms))
+        term_ids = renumber[np.asarray(term_ids, dtype=np.int64)]
+        doc_ids = np.asarray(doc_ids, dtype=np.int32)
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, doc_ids, frequencies = term_ids[order], doc_ids[order], frequencies[order]
+        document_frequency = np.bincount(term_ids, minlength=len(terms))
+        indptr = np.concatenate([[0], np.cumsum(document_frequency)]).astype(np.int64)
+
+        idf = np.log1p((len(df) - document_frequency + 0.5) / (document_frequency + 0.5))
+        average_length = lengths.mean() if len(df) else 1.0
+        norm = k1 * (1 - b + b * lengths[doc_ids] / (average_length or 1.0))
+        weights = (idf[term_ids] * frequencies * (k1 + 1) / (frequencies + norm)).astype(np.float32)
+        nct_ids = np.asarray(df['NCTId'].astype(str).tolist(), dtype=f"<U{max(df['NCTId'].astype(str).map(len), default=1)}")
+        return cls(terms, indptr, doc_ids, weights, nct_ids)
+
+    def __len__(self):
+        return len(self.nct_ids)
+
+    # Function to score a free-text query; returns (row positions, scores) of the top_k trials, best first
+    def search(self, query, top_k=20):
+        tokens = sorted(set(tokenize(query)))
+        if not tokens or not len(self.terms):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        positions = [position for position, token in zip(np.searchsorted(self.terms, tokens), tokens)
+                     if position < len(self.terms) and self.terms[position] == token]
+        if not positions:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        slices = [slice(self.indptr[p], self.indptr[p + 1]) for p in positions]
+        docs = np.concatenate([self.doc_ids[s] for s in slices])
+        weights = np.concatenate([self.weights[s] for s in slices])
+        # Sparse mat-vec: sum the query terms' weights per document
+        unique_docs, inverse = np.unique(docs, return_inverse=True)
+        scores = np.bincount(inverse, weights=weights).astype(np.float32)
+        if len(scores) > top_k:
+            best = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            best = np.arange(len(scores))
+        best = best[np.lexsort((unique_docs[best], -scores[best]))]
+        return unique_docs[best].astype(np.int64), scores[best]
+
+    # Function to return [(NCTId, score)] for a query
+    def top_trials(self, query, top_k=20):
+        positions, scores = self.search(query, top_k)
+        return list(zip(self.nct_ids[positions].tolist(), scores.tolist()))
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in INDEX_FILES:
+            np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+        with open(os.path.join(directory, "meta.json"), "w") as f:
+            json.dump({"trials": len(self), "terms": len(self.terms), "postings": len(self.doc_ids)}, f)
+
+    # Function to open a saved index; the arrays are memory-mapped, so processes share the page cache
+    @classmethod
+    def load(cls, directory, mmap=True):
+        return cls(*(np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None)
+                     for name in INDEX_FILES))
+
+    # Function to load the index saved in directory, building and saving it first when missing.
+    # The sibling directories are indexes of older data versions and are removed after a build.
+    @classmethod
+    def load_or_build(cls, df, directory):
+        if not os.path.exists(os.path.join(directory, "meta.json")):
+            # Build into a private directory and rename it into place, so concurrent builders never see a partial index
+            temporary = f"{directory.rstrip('/')}.tmp-{os.getpid()}"
+            cls.build(df).save(temporary)
+            try:
+                os.rename(temporary, directory)
+            except OSError:
+                shutil.rmtree(temporary, ignore_errors=True)
+            remove_stale_indexes(directory)
+        return cls.load(directory)
+
+# Function to delete the other versions next to directory, leaving in-progress builds of other processes alone.
+# A process still reading an old index keeps its memory-mapped files until it closes them.
+def remove_stale_indexes(directory):
+    parent, current = os.path.split(os.path.normpath(directory))
+    for name in os.listdir(parent or "."):
+        path = os.path.join(parent, name)
+        if name != current and ".tmp-" not in name and os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
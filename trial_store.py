@@ -0,0 +1,85 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from trial_data import TRIAL_COLUMNS, prepare_trials
+
+# On-disk trial store: the prepared trial columns as uncompressed Arrow IPC shards, each covering
+# a contiguous NCTId range, plus a manifest.json. Shards are memory-mapped, so opening the store
+# only reads the short columns; EligibilityCriteria stays in the mapped file and its pages are
+# read when rows are filtered, displayed or extracted.
+#   python trial_store.py clinical_trials_data_filtered.pkl trial_store --shard-size 50000
+
+MANIFEST_FILE = "manifest.json"
+# Columns held in memory as regular pandas columns; the rest stay memory-mapped
+EAGER_COLUMNS = ['NCTId', 'Conditions', 'Keywords', 'BriefTitle']
+
+def is_trial_store(path):
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+# Function to write a prepared trial frame as NCTId-sorted shards of at most shard_size rows
+def write_trial_store(df, directory, shard_size=50000):
+    os.makedirs(directory, exist_ok=True)
+    df = df[TRIAL_COLUMNS].sort_values('NCTId', kind="stable").reset_index(drop=True)
+    schema = pa.schema([(column, pa.string()) for column in TRIAL_COLUMNS])
+    shards = []
+    for number, start in enumerate(range(0, len(df), shard_size)):
+        part = df.iloc[start:start + shard_size]
+        table = pa.Table.from_pandas(part.astype(object).where(part.notna(), None), schema=schema, preserve_index=False)
+        name = f"shard-{number:05d}.arrow"
+        with pa.OSFile(os.path.join(directory, name), "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+            writer.write_table(table)
+        shards.append({"file": name, "rows": len(part), "first_nct_id": part['NCTId'].iloc[0], "last_nct_id": part['NCTId'].iloc[-1]})
+    # The manifest is written last, so a store is only picked up once every shard is complete
+    with open(os.path.join(directory, MANIFEST_FILE), "w") as f:
+        json.dump({"columns": TRIAL_COLUMNS, "rows": len(df), "shards": shards}, f, indent=2)
+    return shards
+
+# Memory-mapped reader for a trial store directory
+class TrialStore:
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+        self.shards = self.manifest["shards"]
+        tables = [pa.ipc.open_file(pa.memory_map(os.path.join(directory, shard["file"]), "r")).read_all() for shard in self.shards]
+        self.table = pa.concat_tables(tables) if tables else pa.table({column: pa.array([], pa.string()) for column in TRIAL_COLUMNS})
+
+    def __len__(self):
+        return self.table.num_rows
+
+    # Prepared trial frame: short columns in memory, EligibilityCriteria as a zero-copy Arrow
+    # column over the mapped shards (missing values read back as NaN, as in the pickle)
+    def frame(self):
+        columns = {}
+        for column in self.table.column_names:
+            if column in EAGER_COLUMNS:
+                values = self.table.column(column).to_pandas()
+                columns[column] = values.where(values.notna(), np.nan)
+            else:
+                columns[column] = self.table.column(column).to_pandas(types_mapper=pd.ArrowDtype)
+        return pd.DataFrame(columns)
+
+# Function to load a trial store as the prepared trial frame, the same shape load_trials returns
+def load_trial_store(directory):
+    return TrialStore(directory).frame()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the trial data pickle into a sharded, memory-mapped Arrow store.")
+    parser.add_argument("source", help="Trial data pickle")
+    parser.add_argument("output", help="Directory for the store")
+    parser.add_argument("--shard-size", type=int, default=50000, help="Trials per shard")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    started = time.perf_counter()
+    shards = write_trial_store(prepare_trials(pd.read_pickle(args.source), concatenate=False), args.output, args.shard_size)
+    print(f"Wrote {sum(shard['rows'] for shard in shards)} trials in {len(shards)} shard(s) to {args.output} "
+          f"in {time.perf_counter() - started:.1f} s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+import pandas as pd
+from memory_report import estimate_bytes
+
+# Memory budget for cached stage outputs, shared by every session of the process
+MAX_CACHE_BYTES = int(float(os.environ.get("SMARTLAB_STAGE_CACHE_MB", "512")) * 2**20)
+
+# Function to hash an uploaded file's bytes (Streamlit UploadedFile or any binary file object)
+def file_digest(uploaded_file):
+    if hasattr(uploaded_file, "getvalue"):
+        data = uploaded_file.getvalue()
+    else:
+        position = uploaded_file.tell()
+        data = uploaded_file.read()
+        uploaded_file.seek(position)
+    return hashlib.sha256(data).hexdigest()
+
+# Function to tell whether pandas copy-on-write is in effect (always from pandas 3, opt-in before)
+def copy_on_write():
+    if int(pd.__version__.split(".")[0]) >= 3:
+        return True
+    return pd.options.mode.copy_on_write is True
+
+# Callers may add, replace or edit columns on a returned frame without touching the cached one.
+# Under copy-on-write a shallow copy is enough; older pandas writes through it, so it gets a deep copy.
+def shared_view(value):
+    if isinstance(value, pd.DataFrame):
+        return value.copy(deep=not copy_on_write())
+    if isinstance(value, tuple):
+        return tuple(shared_view(item) for item in value)
+    return value
+
+# LRU cache of pipeline stage outputs keyed by (stage, *key), where key holds the upload digests
+# and parameters the stage depends on. Entries are evicted least recently used first once their
+# estimated size passes max_bytes, so a rerun reuses every stage whose inputs did not change.
+class StageCache:
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_or_compute(self, stage, key, compute):
+        cache_key = (stage, *key)
+        with self.lock:
+            if cache_key in self.entries:
+                self.entries.move_to_end(cache_key)
+                self.hits += 1
+                return shared_view(self.entries[cache_key][0])
+            self.misses += 1
+        value = compute()
+        size = estimate_bytes(value)
+        with self.lock:
+            if size <= self.max_bytes and cache_key not in self.entries:
+                self.entries[cache_key] = (value, size)
+                self.total_bytes += size
+                while self.total_bytes > self.max_bytes:
+                    _, (_, evicted_size) = self.entries.popitem(last=False)
+                    self.total_bytes -= evicted_size
+        return shared_view(value)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {"entries": len(self.entries), "bytes": self.total_bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+_stage_cache = None
+_stage_cache_lock = threading.Lock()
+
+# Function to get the process-wide stage cache, created on first use
+def get_stage_cache():
+    global _stage_cache
+    with _stage_cache_lock:
+        if _stage_cache is None:
+            _stage_cache = StageCache()
+        return _stage_cache